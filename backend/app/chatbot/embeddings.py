@@ -0,0 +1,142 @@
+"""
+Embeddings - Query Encoder Loading and Micro-Batching
+=====================================================
+Loads the MiniLM sentence encoder and batches encode() calls together.
+
+- load_embedding_model(): tries the int8-quantized ONNX export of the
+  model first, and falls back to the PyTorch model when onnxruntime or
+  optimum is not installed.
+- get_embedding_model(): the process-wide encoder, shared by the chatbot
+  and the document injection routes so stored and query vectors match.
+- EmbeddingBatcher: queues single-query encode() calls from concurrent
+  requests and runs them as one batched forward pass.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# "onnx" (int8 dynamic quantization, VNNI kernels) or "torch"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx")
+ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+# Intra-op threads for the PyTorch fallback (one batched forward pass at a time)
+TORCH_NUM_THREADS = int(os.getenv("EMBEDDING_TORCH_THREADS", str(os.cpu_count() or 1)))
+
+
+def load_embedding_model():
+    """Load the sentence encoder, preferring the quantized ONNX backend"""
+    from sentence_transformers import SentenceTransformer
+
+    if EMBEDDING_BACKEND == "onnx":
+        try:
+            model = SentenceTransformer(
+                EMBEDDING_MODEL_NAME,
+                backend="onnx",
+                model_kwargs={"file_name": ONNX_INT8_FILE}
+            )
+            logger.info("✅ Embedding model loaded (ONNX int8: %s)", ONNX_INT8_FILE)
+            return model
+        except Exception as e:
+            logger.warning("⚠ ONNX embedding backend unavailable (%s), using PyTorch", e)
+
+    import torch
+    torch.set_num_threads(TORCH_NUM_THREADS)
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+_shared_model = None
+_shared_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """Return the shared sentence encoder, loading it on first use"""
+    global _shared_model
+    if _shared_model is None:
+        with _shared_model_lock:
+            if _shared_model is None:
+                _shared_model = load_embedding_model()
+    return _shared_model
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text encode() calls into batched forward passes.
+
+    Callers block on a Future while a background worker drains the queue for
+    up to max_wait_ms (or max_batch items) and encodes everything at once.
+    """
+
+    def __init__(self, model, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def encode(self, text: str) -> np.ndarray:
+        """Encode one text; returns a unit-length float32 vector"""
+        future: Future = Future()
+        self._queue.put((text, future))
+        self._ensure_worker()
+        return future.result()
+
+    def encode_many(self, texts: List[str]) -> List[np.ndarray]:
+        """Encode several texts; they are queued together so they share a batch"""
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        self._ensure_worker()
+        return [future.result() for future in futures]
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(
+                        target=self._run, name="embedding-batcher", daemon=True
+                    )
+                    self._worker.start()
+
+    def _drain(self) -> List[Tuple[str, Future]]:
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._drain()
+            texts = [text for text, _ in items]
+            try:
+                vectors = self.model.encode(
+                    texts,
+                    batch_size=len(texts),
+                    convert_to_numpy=True,
+                    normalize_embeddings=True
+                )
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, future), vec in zip(items, vectors):
+                future.set_result(vec)
@@ -1,56 +1,204 @@
 import os
 import re
-import json
+import asyncio
+import atexit
+import functools
+import hashlib
+import heapq
+import importlib.util
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from types import MappingProxyType
+import numpy as np
+import orjson
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
+import sqlglot
+from sqlglot import exp
 import google.generativeai as genai
 from dotenv import load_dotenv
 from datetime import datetime
 from typing import Optional, Dict, List, Any, Tuple
 
-from .state import AgentState
-from .schema_context import SCHEMA_CONTEXT
+from .state import MAX_HISTORY_TURNS, AgentState, merge_states
+from .schema_context import (
+    CASE_EXAMPLES, SCHEMA_COLUMNS, case_example_ids, get_schema_context, match_columns
+)
+from .semantic_cache import SemanticCache
+from .query_cache import QueryCache, search_cache
+from .embeddings import EmbeddingBatcher, get_embedding_model
 
-# Pinecone + embeddings
+# Custom stream channel for LLM tokens (langgraph >= 0.3)
+try:
+    from langgraph.config import get_stream_writer
+except ImportError:
+    get_stream_writer = None
+
+# Pinecone + embeddings. Only check that sentence_transformers is installed;
+# importing it pulls in torch, which is deferred until the first search.
 try:
     from pinecone import Pinecone
-    from sentence_transformers import SentenceTransformer
-    PINECONE_AVAILABLE = True
+    PINECONE_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
 except Exception:
     PINECONE_AVAILABLE = False
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 model = genai.GenerativeModel("gemini-2.0-flash")
 SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
 
-pinecone_client = None
-document_index = None
-embedding_model = None
-
-if PINECONE_AVAILABLE:
+# Shared connection pool (created on first use, reused across requests)
+DB_POOL_MIN_CONN = 2
+DB_POOL_MAX_CONN = 20
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+# Worker threads / HTTP connections for concurrent Pinecone requests
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "30"))
+
+# Index handle and query encoder are created on first use, so requests that
+# never search (database_only, version_query) don't pay for the model load
+_document_index = None
+_document_index_lock = threading.Lock()
+_query_encoder = None
+_query_encoder_lock = threading.Lock()
+
+if not PINECONE_AVAILABLE:
+    logger.warning("⚠ Pinecone not available")
+
+# Semantic cache of classifier results, keyed by the query embedding
+# blended with the recent turns (context_cache_key).
+# Version fields are stripped before caching ("version 11" and "version 12"
+# embed almost identically) and re-derived from the query on every hit.
+CLASSIFIER_CACHE_PATH = os.getenv("CLASSIFIER_CACHE_PATH")
+classifier_cache = SemanticCache(threshold=0.95, max_entries=10000)
+_CLASSIFIER_CACHE_SKIP_KEYS = ("version_number", "version_range")
+
+if CLASSIFIER_CACHE_PATH:
     try:
-        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        document_index = pc.Index(os.getenv("PINECONE_INDEX_NAME", "document-store"))
-        embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("✅ Pinecone initialized")
+        classifier_cache.load(CLASSIFIER_CACHE_PATH)
     except Exception as e:
-        print(f"⚠ Pinecone error: {e}")
-        PINECONE_AVAILABLE = False
-else:
-    print("⚠ Pinecone not available")
+        logger.warning("⚠ Classifier cache load failed: %s", e)
+    atexit.register(classifier_cache.save, CLASSIFIER_CACHE_PATH)
+
+# Semantic cache of generated SQL for database_only queries, keyed like the
+# classifier cache. Only the SQL is cached; it is always re-executed. A hit
+# is used only when the literals in the cached SQL fit the new query (see
+# sql_literals_match), so "HCPs in Delhi" never reuses the Mumbai SQL.
+SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH")
+SQL_CACHE_THRESHOLD = float(os.getenv("SQL_CACHE_THRESHOLD", "0.95"))
+sql_cache = SemanticCache(threshold=SQL_CACHE_THRESHOLD, max_entries=10000)
+
+if SQL_CACHE_PATH:
+    try:
+        sql_cache.load(SQL_CACHE_PATH)
+    except Exception as e:
+        logger.warning("⚠ SQL cache load failed: %s", e)
+    atexit.register(sql_cache.save, SQL_CACHE_PATH)
+
+
+# Precompiled patterns for the per-request parsing helpers
+# One alternation for version mentions, comparison words and time windows.
+# lastgroup is "vnum", "compare" or "time" depending on which branch matched.
+_QUERY_TOKENS = re.compile(
+    r'(?P<vkind>version|ver|v\.|v)\s+(?P<vnum>\d+)'
+    r'|(?P<compare>compare|between| to )'
+    r'|(?P<time>today|yesterday|(?:last|this) (?:week|month))'
+)
+_VERSION_PRIORITY = {"version": 0, "ver": 1, "v.": 2, "v": 3}
+_TIME_FILTER_DAYS = {
+    "today": 0, "yesterday": 1,
+    "last week": 7, "this week": 7,
+    "last month": 30, "this month": 30,
+}
+_WHITESPACE = re.compile(r'\s+')
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+_SQL_STRING_LITERAL = re.compile(r"'((?:[^']|'')*)'")
+_SQL_LIMIT_CLAUSE = re.compile(r'\blimit\s+\d+', re.IGNORECASE)
+
+# Shared read-only stand-in for matches without metadata
+_EMPTY_METADATA = MappingProxyType({})
+
+# Queries that start like SQL, and phrases that mean the history_table;
+# the router sends both to database_only
+_RAW_SQL_PREFIXES = ("select", "count", "delete", "insert", "update", "with")
+_HISTORY_TABLE_HINTS = (
+    "history", "versions are there", "how many versions", "total versions"
+)
+
+# A request naming one specific column ("show the salary column"); plural
+# "columns" is usually a question about the schema itself
+_COLUMN_REQUEST = re.compile(r'\b(?:column|field|attribute)\b')
+_TABLE_MENTION = re.compile(r'\b(?:table|target list|target_list)\b')
+UNKNOWN_COLUMN_ERROR = "That column does not exist in target_list or history_table."
+
+
+def strip_code_fences(text: str) -> str:
+    """Remove a leading ```lang and trailing ``` fence from LLM output"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text[3:]
+        for lang in ("json", "sql", "SQL"):
+            if text.startswith(lang):
+                text = text[len(lang):]
+                break
+    return text.removesuffix("```").strip()
 
 
-def debug(msg: str):
-    """Debug logging with timestamp"""
-    ts = datetime.now().isoformat()
-    print(f"[DEBUG] {ts} | {msg}")
+def _dumps(obj: Any) -> str:
+    """Indented JSON for prompts/responses; str() for Decimal and other unknown types"""
+    return orjson.dumps(
+        obj, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+    ).decode()
+
+
+def generate_streamed(prompt: str) -> str:
+    """
+    Generate with Gemini's streaming API and return the full text.
+    Each chunk is also written to the graph's "custom" stream as
+    {"summary_token": text}, so /chatbot/query/stream can forward it live.
+    """
+    write = None
+    if get_stream_writer is not None:
+        try:
+            write = get_stream_writer()
+        except RuntimeError:
+            # Called outside a graph run (e.g. execute_query)
+            write = None
+
+    parts = []
+    for chunk in model.generate_content(prompt, stream=True):
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunk without text parts (e.g. finish/safety metadata)
+            continue
+        parts.append(text)
+        if write is not None:
+            write({"summary_token": text})
+    return "".join(parts)
+
+
+def strip_markdown(text: str) -> str:
+    """Remove bold/underline/code markers from LLM prose"""
+    # Chained str.replace is a C-level scan per marker; a combined regex
+    # (\*\*|__|```) measured ~3x slower on typical summaries
+    return text.replace("**", "").replace("__", "").replace("```", "")
 
 
 def clean_sql(sql_text: str) -> str:
     """Remove markdown from SQL"""
-    return re.sub(r'```(sql|SQL)?', '', sql_text).strip()
+    return strip_code_fences(sql_text)
+
+
+# Turns of conversation the LLM prompts (and the cache keys) see
+CONTEXT_TURNS = 3
 
 
 def get_context_string(state: AgentState) -> str:
@@ -59,11 +207,15 @@ def get_context_string(state: AgentState) -> str:
     if not history:
         return "No previous context."
     
+    recent = tuple((turn.get('query', ''), turn.get('route', '')) for turn in history[-CONTEXT_TURNS:])
+    return _format_context(recent)
+
+
+@functools.lru_cache(maxsize=256)
+def _format_context(recent: Tuple[Tuple[str, str], ...]) -> str:
+    """Format the last turns; memoized since router and database nodes ask for the same turns"""
     lines = ["Recent conversation:"]
-    for i, turn in enumerate(history[-3:], 1):
-        query = turn.get('query', '')
-        route = turn.get('route', '')
-        
+    for i, (query, route) in enumerate(recent, 1):
         # Extract version if present
         version = parse_version_number(query)
         version_tag = f"[Version {version}]" if version else ""
@@ -78,51 +230,60 @@ def get_context_string(state: AgentState) -> str:
 
 
 
+@dataclass
+class ParsedQuery:
+    """Filters extracted from a user query"""
+    version_number: Optional[int] = None
+    version_range: Optional[Tuple[int, int]] = None
+    time_filter: Optional[int] = None
+    uploader: Optional[str] = None
+
+
+def _scan_query(query_lower: str) -> ParsedQuery:
+    """Extract version number/range and time filter in one regex pass"""
+    versions = []           # (priority, number) in query order
+    has_compare = False
+    time_filter = None
+
+    for m in _QUERY_TOKENS.finditer(query_lower):
+        kind = m.lastgroup
+        if kind == "vnum":
+            versions.append((_VERSION_PRIORITY[m.group("vkind")], int(m.group("vnum"))))
+        elif kind == "compare":
+            has_compare = True
+        else:
+            days = _TIME_FILTER_DAYS[m.group("time")]
+            time_filter = days if time_filter is None else min(time_filter, days)
+
+    parsed = ParsedQuery(time_filter=time_filter)
+    if versions:
+        # "version N" wins over "ver N", "v. N", "v N"; first occurrence within a kind
+        parsed.version_number = min(versions, key=lambda v: v[0])[1]
+        if has_compare and len(versions) >= 2:
+            parsed.version_range = (versions[0][1], versions[1][1])
+    return parsed
+
+
+def parse_query(query: str) -> ParsedQuery:
+    """Extract every routing filter from the query"""
+    parsed = _scan_query(query.lower())
+    parsed.uploader = parse_uploader_filter(query)
+    return parsed
+
+
 def parse_version_number(query: str) -> Optional[int]:
     """Extract single version number from query"""
-    query_lower = query.lower()
-    
-    patterns = [
-        r'version\s+(\d+)',
-        r'ver\s+(\d+)',
-        r'v\.\s+(\d+)',
-        r'v\s+(\d+)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, query_lower)
-        if match:
-            return int(match.group(1))
-    
-    return None
+    return _scan_query(query.lower()).version_number
 
 
 def parse_version_range(query: str) -> Optional[Tuple[int, int]]:
     """Extract version range for comparisons"""
-    query_lower = query.lower()
-    
-    if "compare" in query_lower or "between" in query_lower or " to " in query_lower:
-        versions = re.findall(r'(?:version|ver|v\.?)\s+(\d+)', query_lower)
-        if len(versions) >= 2:
-            return (int(versions[0]), int(versions[1]))
-    
-    return None
+    return _scan_query(query.lower()).version_range
 
 
 def parse_time_filter(query: str) -> Optional[int]:
     """Extract time filter from query"""
-    query_lower = query.lower()
-    
-    if "today" in query_lower:
-        return 0
-    elif "yesterday" in query_lower:
-        return 1
-    elif "last week" in query_lower or "this week" in query_lower:
-        return 7
-    elif "last month" in query_lower or "this month" in query_lower:
-        return 30
-    
-    return None
+    return _scan_query(query.lower()).time_filter
 
 
 def parse_uploader_filter(query: str) -> Optional[str]:
@@ -158,59 +319,227 @@ def parse_uploader_filter(query: str) -> Optional[str]:
     return None
 
 
-def execute_sql_query(sql: str) -> List[Dict]:
-    """Execute SQL and return results"""
-    debug(f"Executing SQL:\n{sql}")
+def get_db_pool() -> Optional[psycopg2.pool.ThreadedConnectionPool]:
+    """Return the shared psycopg2 connection pool, creating it on first use"""
+    global _db_pool
+    if _db_pool is None and SUPABASE_DB_URL:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = psycopg2.pool.ThreadedConnectionPool(
+                    minconn=DB_POOL_MIN_CONN,
+                    maxconn=DB_POOL_MAX_CONN,
+                    dsn=SUPABASE_DB_URL
+                )
+                atexit.register(_db_pool.closeall)
+                logger.debug("DB pool created (%s-%s connections)", DB_POOL_MIN_CONN, DB_POOL_MAX_CONN)
+    return _db_pool
+
+
+def get_document_index():
+    """Return the Pinecone index handle, connecting on first use"""
+    global _document_index, PINECONE_AVAILABLE
+    if _document_index is None and PINECONE_AVAILABLE:
+        with _document_index_lock:
+            if _document_index is None and PINECONE_AVAILABLE:
+                try:
+                    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+                    _document_index = pc.Index(
+                        os.getenv("PINECONE_INDEX_NAME", "document-store"),
+                        pool_threads=PINECONE_POOL_THREADS
+                    )
+                    logger.info("✅ Pinecone initialized")
+                except Exception as e:
+                    logger.warning("⚠ Pinecone error: %s", e)
+                    PINECONE_AVAILABLE = False
+    return _document_index
+
+
+def get_query_encoder() -> Optional[EmbeddingBatcher]:
+    """Return the batched query encoder, loading the model on first use (blocking)"""
+    global _query_encoder, PINECONE_AVAILABLE
+    if _query_encoder is None and PINECONE_AVAILABLE:
+        with _query_encoder_lock:
+            if _query_encoder is None and PINECONE_AVAILABLE:
+                try:
+                    _query_encoder = EmbeddingBatcher(get_embedding_model())
+                except Exception as e:
+                    logger.warning("⚠ Embedding model error: %s", e)
+                    PINECONE_AVAILABLE = False
+    return _query_encoder
+
+
+# Parameterized history_table queries used by the version nodes
+VERSION_COMPARISON_SQL = """
+SELECT h1.version_number as v1_version, h1.total_rows as v1_total_rows,
+       h1.changed_rows as v1_changed_rows, h1.operation_type as v1_operation,
+       h2.version_number as v2_version, h2.total_rows as v2_total_rows,
+       h2.changed_rows as v2_changed_rows, h2.operation_type as v2_operation,
+       (h2.total_rows - h1.total_rows) as row_difference,
+       h2.reason, h2.triggered_by, h2.timestamp, h2.doc_id, h2.filename
+FROM public.history_table h1
+JOIN public.history_table h2 ON h1.table_name = h2.table_name
+WHERE h1.version_number = %s AND h2.version_number = %s
+ORDER BY h2.timestamp DESC;
+"""
+
+VERSION_DETAIL_SQL = """
+SELECT version_id, version_number, table_name, total_rows,
+       changed_rows, operation_type, reason, triggered_by,
+       timestamp, doc_id, filename, file_type, num_chunks
+FROM public.history_table
+WHERE version_number = %s
+ORDER BY timestamp DESC
+LIMIT 10;
+"""
+
+LATEST_VERSIONS_SQL = """
+SELECT version_id, version_number, table_name, total_rows,
+       changed_rows, operation_type, reason, triggered_by,
+       timestamp, doc_id, filename, file_type
+FROM public.history_table
+ORDER BY version_id DESC
+LIMIT 5;
+"""
+
+VERSION_HYBRID_SQL = """
+SELECT version_id, version_number, table_name, total_rows,
+       changed_rows, operation_type, reason, triggered_by,
+       timestamp, doc_id, filename, file_type, num_chunks
+FROM public.history_table
+WHERE version_number = %s
+LIMIT 5;
+"""
+
+
+def execute_sql_query(sql: str, params: Tuple = ()) -> List[Dict]:
+    """Execute SQL (optionally with %s parameters) and return results"""
+    logger.debug("Executing SQL:\n%s\nParams: %s", sql, params)
     
     if not SUPABASE_DB_URL or not sql:
-        debug("DB URL or SQL missing -> returning []")
+        logger.debug("DB URL or SQL missing -> returning []")
         return []
     
+    pool = None
     conn = None
+    broken = False
     try:
-        conn = psycopg2.connect(SUPABASE_DB_URL)
+        pool = get_db_pool()
+        conn = pool.getconn()
+        if not conn.autocommit:
+            # Read-only autocommit: no BEGIN/ROLLBACK round trips around each query
+            conn.set_session(readonly=True, autocommit=True)
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(sql)
+            cur.execute(sql, params or None)
+            # RealDictRow is already a dict subclass; no per-row copy needed
             rows = cur.fetchall()
-            debug(f"SQL returned {len(rows)} rows")
-            return [dict(r) for r in rows]
+            logger.debug("SQL returned %s rows", len(rows))
+            return rows
     except Exception as e:
-        debug(f"❌ SQL Error: {e}")
+        logger.error("❌ SQL Error: %s", e)
+        broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
         return []
     finally:
         if conn:
-            conn.close()
+            pool.putconn(conn, close=broken or bool(conn.closed))
 
 
-def save_to_memory(state: AgentState) -> AgentState:
-    """Save query to conversation history"""
-    try:
-        history = state.get("conversation_history", [])
-        if not isinstance(history, list):
-            history = []
-        
-        new_turn = {
-            "query": state.get("user_query", ""),
-            "response": state.get("response", ""),
-            "route": state.get("route", "unknown"),
-            "timestamp": datetime.now().isoformat()
-        }
+def latest_version_in_history(history: List[Dict]) -> Optional[int]:
+    """Scan history (most recent first) for a version number in a user query"""
+    for turn in reversed(history):
+        # Get query text (handle both formats)
+        prev_query = turn.get("query") or turn.get("content", "")
         
-        history.append(new_turn)
-        state["conversation_history"] = history[-5:]
+        # Skip assistant responses
+        if turn.get("role") == "assistant" or not prev_query:
+            continue
         
-        debug(f"Memory saved. History: {len(state['conversation_history'])} turns")
-    except Exception as e:
-        debug(f"⚠ Memory save failed: {e}")
-    
-    return state
+        prev_version = parse_version_number(prev_query)
+        if prev_version:
+            return prev_version
+    return None
 
 
+def _memory_turn(state: AgentState, response: str) -> Dict[str, Any]:
+    """Build the conversation_history entry for this turn"""
+    return {
+        "query": state.get("user_query", ""),
+        "response": response,
+        "route": state.get("route", "unknown"),
+        "timestamp": datetime.now().isoformat()
+    }
 
-def llm_classify_query(query: str, context: str) -> Dict[str, Any]:
-    """Use LLM to classify query intent with conversation context"""
-    
-    classification_prompt = f"""
+
+def memory_updates(state: AgentState, response: str) -> Dict[str, Any]:
+    """
+    Partial update recording this turn, for graph nodes. Only the new turn is
+    returned; the conversation_history reducer (append_bounded) appends it.
+    """
+    new_turn = _memory_turn(state, response)
+    return {
+        "conversation_history": [new_turn],
+        "last_seen_version": (
+            parse_version_number(new_turn["query"]) or state.get("last_seen_version")
+        ),
+    }
+
+
+EXPLANATION_KEYWORDS = ("why", "reason", "explain", "explanation", "detailed", "cause", "what happened")
+FIRST_VERSION_KEYWORDS = ("first version", "oldest version", "earliest version", "starting version", "initial version")
+
+
+def fast_classify(query: str, parsed: Optional[ParsedQuery] = None) -> Optional[Dict[str, Any]]:
+    """
+    Deterministic classifier for queries the rules fully decide.
+    Returns a classification dict (same shape as the LLM output) or None
+    when the query needs the LLM.
+    """
+    query_lower = query.lower()
+    parsed = parsed or parse_query(query)
+
+    def classification(route: str, reasoning: str, confidence: float, **fields) -> Dict[str, Any]:
+        result = {
+            "route": route,
+            "reasoning": reasoning,
+            "confidence": confidence,
+            "version_number": None,
+            "version_range": None,
+            "wants_explanation": False,
+            "needs_reason": False,
+            "has_uploader_filter": False,
+            "suggested_message": None
+        }
+        result.update(fields)
+        return result
+
+    # RULE 9 — first / oldest version (wins over every other rule)
+    if any(kw in query_lower for kw in FIRST_VERSION_KEYWORDS):
+        return classification("version_query", "Rule: first/oldest version", 0.99, version_number=1)
+
+    has_explanation_keyword = any(kw in query_lower for kw in EXPLANATION_KEYWORDS)
+    explicit_version = parsed.version_number
+
+    # SUPER RULE — explicit version + explanation keyword
+    if explicit_version and has_explanation_keyword:
+        return classification(
+            "version_hybrid", "Rule: version + explanation keyword", 0.98,
+            version_number=explicit_version, wants_explanation=True, needs_reason=True
+        )
+
+    # COMPARISON RULE — compare/between with two explicit versions
+    version_range = parsed.version_range
+    if version_range and not has_explanation_keyword:
+        v1, v2 = version_range
+        return classification(
+            "version_query", "Rule: version comparison", 0.97,
+            version_range=[min(v1, v2), max(v1, v2)]
+        )
+
+    return None
+
+
+# Static classifier rules, bound once as the classifier model's system
+# instruction; each call only sends the query and conversation context.
+CLASSIFIER_SYSTEM_PROMPT = """
 You are a highly precise QUERY INTENT CLASSIFIER. 
 Your job is ONLY to classify the user's query intent — NOT to answer the query.
 
@@ -218,16 +547,6 @@ You MUST follow rules strictly.
 You MUST NOT guess or interpret vaguely.  
 You MUST classify EXACTLY what the user is asking.
 
-────────────────────────────────────────
-USER QUERY (analyze VERY CAREFULLY)
-────────────────────────────────────────
-"{query}"
-
-────────────────────────────────────────
-CONVERSATION CONTEXT (VERY IMPORTANT)
-────────────────────────────────────────
-{context}
-
 If the context mentions a version number AND the current query uses:
 - “this version”
 - “that version”
@@ -349,6 +668,14 @@ SELECT, UPDATE, DELETE, INSERT, COUNT, WITH
 
 → route = "database_only"
 
+────────────────────────────────────────
+INVALID RULE
+────────────────────────────────────────
+If the query is small talk, off-topic, or not about HCPs, the target list,
+versions or documents at all (e.g. "book me a flight", "what is 2+2"):
+
+→ route = "invalid"
+
 ────────────────────────────────────────
 OUTPUT FORMAT — STRICT JSON ONLY
 ────────────────────────────────────────
@@ -356,8 +683,8 @@ OUTPUT FORMAT — STRICT JSON ONLY
 
 Return ONLY valid JSON:
 
-{{
-  "route": "<database_only | version_query | version_hybrid | semantic_search>",
+{
+  "route": "<database_only | version_query | version_hybrid | semantic_search | invalid>",
   "reasoning": "Brief explanation",
   "confidence": 0.95,
   "version_number": null,
@@ -366,40 +693,115 @@ Return ONLY valid JSON:
   "needs_reason": false,
   "has_uploader_filter": false,
   "suggested_message": null
-}}
+}
+"""
+
+CLASSIFIER_REQUEST_TEMPLATE = """
+────────────────────────────────────────
+USER QUERY (analyze VERY CAREFULLY)
+────────────────────────────────────────
+"{query}"
+
+────────────────────────────────────────
+CONVERSATION CONTEXT (VERY IMPORTANT)
+────────────────────────────────────────
+{context}
 
 Analyze now and return JSON.
 """
 
-    prompt = classification_prompt
-    debug(f"Classifier prompt length: {len(prompt)} chars")
+classifier_model = genai.GenerativeModel(
+    "gemini-2.0-flash",
+    system_instruction=CLASSIFIER_SYSTEM_PROMPT
+)
+
+
+# Weight of the query itself in a cache key, and per-turn decay of the
+# earlier queries blended in (newest turn first)
+CACHE_QUERY_WEIGHT = 0.7
+CACHE_HISTORY_DECAY = 0.8
+
+
+def context_cache_key(query_encoder, query: str, history: List[Dict[str, Any]]):
+    """
+    Semantic-cache key for a query in its conversation:
+    w * embed(query) + (1 - w) * sum(decay**i * embed(turn_i)) over the
+    last CONTEXT_TURNS queries, so follow-ups like "what are the
+    differences?" only match in a similar conversation. With no history
+    this is the plain query embedding (SemanticCache normalizes keys).
+    """
+    turns = [
+        turn["query"] for turn in reversed(history[-CONTEXT_TURNS:]) if turn.get("query")
+    ]
+    if not turns:
+        return query_encoder.encode(query)
+
+    vectors = query_encoder.encode_many([query, *turns])
+    key = CACHE_QUERY_WEIGHT * vectors[0]
+    for i, vec in enumerate(vectors[1:]):
+        key += (1 - CACHE_QUERY_WEIGHT) * CACHE_HISTORY_DECAY ** i * vec
+    return key
+
+
+async def llm_classify_query(
+    query: str,
+    context: str,
+    parsed: Optional[ParsedQuery] = None,
+    history: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """Use LLM to classify query intent with conversation context"""
+    parsed = parsed or parse_query(query)
+    
+    prompt = CLASSIFIER_REQUEST_TEMPLATE.format(query=query, context=context)
+    logger.debug("Classifier prompt length: %s chars", len(prompt))
 
     try:
-        response = model.generate_content(prompt)
-        clean_text = response.text.strip()
-        clean_text = clean_text.replace("```json", "").replace("```", "").strip()
+        q_emb = None
+        cached = None
+        # Use the encoder only once a search has loaded it; a cold request
+        # starts the load in the background and goes straight to the LLM
+        query_encoder = _query_encoder
+        if query_encoder is None and PINECONE_AVAILABLE:
+            asyncio.get_running_loop().run_in_executor(None, get_query_encoder)
+        if query_encoder is not None:
+            q_emb = await asyncio.to_thread(
+                context_cache_key, query_encoder, query, history or []
+            )
+            cached = classifier_cache.lookup(q_emb)
+
+        if cached is not None:
+            logger.debug("Classifier cache hit")
+            result = dict(cached)
+        else:
+            response = await classifier_model.generate_content_async(prompt)
+            clean_text = strip_code_fences(response.text)
+
+            logger.debug("Classifier raw output:\n%s", clean_text)
+            result = orjson.loads(clean_text)
 
-        debug(f"Classifier raw output:\n{clean_text}")
-        result = json.loads(clean_text)
+            # Normalize
+            if not isinstance(result, dict):
+                raise ValueError("Classifier did not return a JSON object")
 
-        # Normalize
-        if not isinstance(result, dict):
-            raise ValueError("Classifier did not return a JSON object")
+            if q_emb is not None:
+                classifier_cache.add(q_emb, {
+                    k: v for k, v in result.items() if k not in _CLASSIFIER_CACHE_SKIP_KEYS
+                })
 
         query_lower = query.lower()
 
         # Extract explicit version number / range
-        explicit_version = parse_version_number(query)
-        version_range = parse_version_range(query)
+        explicit_version = parsed.version_number
+        version_range = parsed.version_range
 
         # SUPER RULE — version + explanation
         has_explanation_keyword = any(
             kw in query_lower for kw in
-            ["why", "reason", "explain", "explanation", "detailed", "cause", "what happened"]
+            EXPLANATION_KEYWORDS
         )
 
         if explicit_version and has_explanation_keyword:
-            debug("⚠ SUPER RULE → forcing version_hybrid")
+            logger.debug("⚠ SUPER RULE → forcing version_hybrid")
             result["route"] = "version_hybrid"
             result["version_number"] = explicit_version
             result["wants_explanation"] = True
@@ -409,27 +811,27 @@ Analyze now and return JSON.
         # RULE 9 — FIRST / OLDEST VERSION
         if any(
             kw in query_lower for kw in
-            ["first version", "oldest version", "earliest version", "starting version", "initial version"]
+            FIRST_VERSION_KEYWORDS
         ):
-            debug("⚠ RULE 9 → forcing version_number = 1")
+            logger.debug("⚠ RULE 9 → forcing version_number = 1")
             result["route"] = "version_query"
             result["version_number"] = 1
             result["confidence"] = 0.99
 
         # Preserve version_range if classifier did not fill it
         if version_range and not result.get("version_range"):
-            debug(f"Preserving version_range {version_range} from parsing")
+            logger.debug("Preserving version_range %s from parsing", version_range)
             result["version_range"] = version_range
 
         # Preserve explicit version when classifier didn't return one
         if explicit_version and not result.get("version_number") and not version_range:
-            debug(f"Preserving extracted version {explicit_version}")
+            logger.debug("Preserving extracted version %s", explicit_version)
             result["version_number"] = explicit_version
 
         return result
 
     except Exception as e:
-        debug(f"❌ Classification error: {e}")
+        logger.error("❌ Classification error: %s", e)
         return {
             "route": "invalid",
             "reasoning": str(e),
@@ -439,121 +841,134 @@ Analyze now and return JSON.
 
 
 
-def router_node(state: AgentState) -> AgentState:
+async def router_node(state: AgentState) -> AgentState:
     """
     Improved Router with conversation context awareness
     """
-    state_copy = dict(state)
-    query = state_copy.get("user_query", "")
+    updates: Dict[str, Any] = {}
+    query = state.get("user_query", "")
     query_lower = query.lower().strip()
 
-    print(f"\n{'='*70}")
-    print(f"🎯 INTELLIGENT ROUTING (CONTEXT-AWARE)")
-    print(f"{'='*70}\n")
+    logger.info("🎯 INTELLIGENT ROUTING (CONTEXT-AWARE)")
 
-    debug(f"Routing Query: {query}")
+    logger.debug("Routing Query: %s", query)
 
     # Get conversation history
-    history = state_copy.get("conversation_history", [])
-    debug(f"📚 Conversation History Length: {len(history)}")
+    history = state.get("conversation_history", [])
+    logger.debug("📚 Conversation History Length: %s", len(history))
 
-    version_num = parse_version_number(query)
-    version_range = parse_version_range(query)
+    parsed = parse_query(query)
+    version_num = parsed.version_number
+    version_range = parsed.version_range
     
-    debug(f"🔢 Version from current query: {version_num}")
+    logger.debug("🔢 Version from current query: %s", version_num)
+
+    # Most recent version seen before this turn. Tracked incrementally;
+    # only fall back to scanning history when the state predates tracking.
+    if "last_seen_version" in state:
+        previous_version = state.get("last_seen_version")
+    else:
+        previous_version = latest_version_in_history(history)
+    updates["last_seen_version"] = version_num or previous_version
 
     context_version = None
     if not version_num and not version_range and history:
-        debug("⚠️ No version in current query - checking history...")
-        
-        # Search through history in reverse (most recent first)
-        for turn in reversed(history):
-            # Get query text (handle both formats)
-            prev_query = turn.get("query") or turn.get("content", "")
-            
-            # Skip assistant responses
-            if turn.get("role") == "assistant" or not prev_query:
-                continue
-            
-            prev_version = parse_version_number(prev_query)
-            if prev_version:
-                debug(f"✅ Found version {prev_version} in history")
-                debug(f"   Previous query was: {prev_query[:80]}")
-                context_version = prev_version
-                version_num = prev_version
-                break
+        logger.debug("⚠️ No version in current query - checking history...")
         
-        if not context_version:
-            debug("❌ No version found in history")
+        if previous_version:
+            logger.debug("✅ Found version %s in history", previous_version)
+            context_version = previous_version
+            version_num = previous_version
+        else:
+            logger.debug("❌ No version found in history")
 
-    context = get_context_string(state_copy)
+    context = get_context_string(state)
     enhanced_context = context
     
     if version_num:
         source = "current query" if not context_version else "conversation history"
         enhanced_context += f"\n\n🔍 VERSION FROM {source.upper()}: {version_num}"
-        debug(f"📌 Enhanced context with version {version_num} from {source}")
+        logger.debug("📌 Enhanced context with version %s from %s", version_num, source)
 
     # RAW SQL SHORTCUT
-    if query_lower.startswith(("select", "count", "delete", "insert", "update", "with")):
-        debug("RAW SQL detected → forcing database_only")
-        state_copy["route"] = "database_only"
-        state_copy["version_number"] = version_num
-        state_copy["version_range"] = version_range
-        return state_copy
+    if query_lower.startswith(_RAW_SQL_PREFIXES):
+        logger.debug("RAW SQL detected → forcing database_only")
+        updates["route"] = "database_only"
+        updates["version_number"] = version_num
+        updates["version_range"] = version_range
+        return updates
 
     # HISTORY TABLE SHORTCUT
-    if ("history" in query_lower or
-        "history_table" in query_lower or
-        "versions are there" in query_lower or
-        "how many versions" in query_lower or
-        "total versions" in query_lower):
+    if any(hint in query_lower for hint in _HISTORY_TABLE_HINTS):
         
-        debug("History-table question detected → forcing database_only")
-        state_copy["route"] = "database_only"
-        state_copy["version_number"] = version_num
-        state_copy["version_range"] = version_range
-        return state_copy
-
-    uploader = parse_uploader_filter(query)
+        logger.debug("History-table question detected → forcing database_only")
+        updates["route"] = "database_only"
+        updates["version_number"] = version_num
+        updates["version_range"] = version_range
+        return updates
+
+    # UNKNOWN COLUMN SHORTCUT (case type 8) - no LLM round trip to find out
+    if (_COLUMN_REQUEST.search(query_lower)
+            and not _TABLE_MENTION.search(query_lower)
+            and not match_columns(query_lower)):
+        logger.debug("Requested column not in schema → invalid")
+        updates["route"] = "invalid"
+        updates["routing_reason"] = "Requested column does not exist"
+        updates["error"] = UNKNOWN_COLUMN_ERROR
+        return updates
+
+    # SMALL TALK SHORTCUT - greetings/help/off-topic get a canned reply
+    if lookup_canned_reply(query) is not None:
+        logger.debug("Small talk detected → invalid (canned reply)")
+        updates["route"] = "invalid"
+        updates["routing_reason"] = "Small talk"
+        return updates
+
+    uploader = parsed.uploader
     if uploader:
-        debug(f"Detected uploader filter: {uploader}")
+        logger.debug("Detected uploader filter: %s", uploader)
 
     # CALL LLM CLASSIFIER
-    classification = llm_classify_query(query, enhanced_context)
+    classification = fast_classify(query, parsed)
+    if classification:
+        logger.debug("⚡ Rule-based classification: %s", classification['reasoning'])
+    else:
+        classification = await llm_classify_query(
+            query, enhanced_context, parsed, state.get("conversation_history", [])
+        )
     route = classification.get("route", "invalid").lower()
 
-    debug(f"🤖 LLM Classification Result:")
-    debug(f"   Route: {route}")
-    debug(f"   Version Number: {classification.get('version_number')}")
-    debug(f"   Version Range: {classification.get('version_range')}")
+    logger.debug("🤖 LLM Classification Result:")
+    logger.debug("   Route: %s", route)
+    logger.debug("   Version Number: %s", classification.get('version_number'))
+    logger.debug("   Version Range: %s", classification.get('version_range'))
 
     # ✅ CRITICAL FIX: Preserve version_range from LLM
     llm_version_range = classification.get("version_range")
     if llm_version_range and not version_range:
-        debug(f"✅ Using version_range from LLM: {llm_version_range}")
+        logger.debug("✅ Using version_range from LLM: %s", llm_version_range)
         version_range = llm_version_range
     
     # DO NOT override version_number when version_range exists
     if version_range:
-        debug("Version range detected — skipping single-version override")
+        logger.debug("Version range detected — skipping single-version override")
     else:
         # Only force version_number if LLM did not return any version info
         if version_num and not classification.get("version_number"):
-            debug(f"🔧 FORCING single version from parsing: {version_num}")
+            logger.debug("🔧 FORCING single version from parsing: %s", version_num)
             classification["version_number"] = version_num
 
     # SUPER RULE: Version + explanation keywords
     query_lower = query.lower()
     has_explanation_keyword = any(
         kw in query_lower for kw in 
-        ["why", "reason", "explain", "explanation", "detailed", "cause", "what happened"]
+        EXPLANATION_KEYWORDS
     )
     
     # If we have a version (from current OR context) + explanation keywords
     # MUST be hybrid
     if version_num and has_explanation_keyword:
-        debug("⚠️ SUPER RULE: Version + explanation keywords detected")
+        logger.debug("⚠️ SUPER RULE: Version + explanation keywords detected")
         route = "version_hybrid"
         classification["route"] = "version_hybrid"
         classification["version_number"] = version_num
@@ -561,54 +976,161 @@ def router_node(state: AgentState) -> AgentState:
         classification["needs_reason"] = True
 
     if uploader and route == "semantic_search":
-        debug("Uploader filter + semantic → upgrading to hybrid")
+        logger.debug("Uploader filter + semantic → upgrading to hybrid")
         route = "version_hybrid"
 
-    # Validate route
-    allowed_routes = ["database_only", "version_query", "version_hybrid", "semantic_search"]
+    # Validate route ("invalid" goes to INVALID_HANDLER for a suggestion)
+    allowed_routes = ["database_only", "version_query", "version_hybrid", "semantic_search", "invalid"]
     if route not in allowed_routes:
-        debug(f"Invalid route '{route}', defaulting to database_only")
+        logger.debug("Invalid route '%s', defaulting to database_only", route)
         route = "database_only"
 
     if route == "hybrid":
         route = "version_hybrid"
 
     # ✅ FINAL STATE ASSIGNMENT - USE version_range from LLM if available
-    state_copy["route"] = route
-    state_copy["routing_reason"] = classification.get("reasoning", "")
-    state_copy["routing_confidence"] = classification.get("confidence", 0.0)
-    state_copy["version_number"] = classification.get("version_number") or version_num
-    state_copy["version_range"] = version_range or classification.get("version_range")  # ✅ CRITICAL
-    state_copy["wants_explanation"] = classification.get("wants_explanation", False)
-    state_copy["needs_reason"] = classification.get("needs_reason", False)
-    state_copy["uploader_filter"] = uploader
-    state_copy["time_filter"] = parse_time_filter(query)
-
-    debug(f"FINAL ROUTE: {route.upper()}")
-    debug(f"FINAL VERSION NUMBER: {state_copy.get('version_number')}")
-    debug(f"FINAL VERSION RANGE: {state_copy.get('version_range')}")
-    print(f"{'='*70}\n")
-    return state_copy
-
-def database_query_node(state: AgentState) -> AgentState:
+    updates["route"] = route
+    updates["routing_reason"] = classification.get("reasoning", "")
+    updates["routing_confidence"] = classification.get("confidence", 0.0)
+    updates["version_number"] = classification.get("version_number") or version_num
+    updates["version_range"] = version_range or classification.get("version_range")  # ✅ CRITICAL
+    updates["wants_explanation"] = classification.get("wants_explanation", False)
+    updates["needs_reason"] = classification.get("needs_reason", False)
+    updates["uploader_filter"] = uploader
+    updates["time_filter"] = parsed.time_filter
+
+    logger.debug("FINAL ROUTE: %s", route.upper())
+    logger.debug("FINAL VERSION NUMBER: %s", updates.get('version_number'))
+    logger.debug("FINAL VERSION RANGE: %s", updates.get('version_range'))
+    return updates
+
+def sql_schema_table(query: str) -> Optional[str]:
+    """
+    Table whose schema the SQL prompt needs: "history_table" for history
+    questions, None (both tables) for raw SQL or other version mentions,
+    otherwise "target_list".
+    """
+    query_lower = query.lower().strip()
+    if any(hint in query_lower for hint in _HISTORY_TABLE_HINTS):
+        return "history_table"
+    if query_lower.startswith(_RAW_SQL_PREFIXES) or "version" in query_lower:
+        return None
+    return "target_list"
+
+
+def sql_literals_match(sql: str, query: str) -> bool:
+    """
+    Whether SQL cached for a similar query fits this one: every string
+    literal in the SQL (ILIKE wildcards stripped) appears in the query as
+    whole words ('Male' does not match "female"),
+    every number in the SQL outside LIMIT appears in the query, and every
+    number in the query appears in the SQL.
+    """
+    query_lower = query.lower()
+    for literal in _SQL_STRING_LITERAL.findall(sql):
+        value = literal.strip("%").replace("''", "'").lower()
+        if value and not re.search(rf"(?<!\w){re.escape(value)}(?!\w)", query_lower):
+            return False
+
+    sql_code = _SQL_STRING_LITERAL.sub("", sql)
+    query_numbers = set(_NUMBER.findall(query_lower))
+    filter_numbers = set(_NUMBER.findall(_SQL_LIMIT_CLAUSE.sub("", sql_code)))
+    return filter_numbers <= query_numbers <= set(_NUMBER.findall(sql_code))
+
+
+# Server functions generated SQL may not call: sleeps, file and large-object
+# access, remote connections, settings and backend control
+_DENIED_SQL_FUNCTION_PREFIXES = ("pg_", "lo_", "dblink", "set_config", "query_to_xml")
+
+
+def _sql_function_name(func: exp.Func) -> str:
+    return (func.name if isinstance(func, exp.Anonymous) else func.sql_name()).lower()
+
+
+def validate_sql(sql: str) -> Tuple[bool, str]:
+    """
+    Check generated SQL locally before it reaches Postgres: exactly one
+    read-only query (no row locks, no denied server functions) over known
+    tables and columns (select-list aliases and CTE names allowed).
+    Returns (ok, reason).
+    """
+    try:
+        statements = [tree for tree in sqlglot.parse(sql, read="postgres") if tree is not None]
+    except sqlglot.errors.ParseError as e:
+        return False, f"SQL does not parse: {str(e).splitlines()[0]}"
+    if len(statements) != 1:
+        return False, "expected exactly one SQL statement"
+
+    tree = statements[0]
+    if not isinstance(tree, exp.Query) or tree.find(
+        exp.DML, exp.DDL, exp.Drop, exp.Alter, exp.Command
+    ):
+        return False, "only SELECT queries are allowed"
+    if tree.find(exp.Lock):
+        return False, "locking clauses (FOR UPDATE/SHARE) are not allowed"
+    for func in tree.find_all(exp.Func):
+        name = _sql_function_name(func)
+        if name.startswith(_DENIED_SQL_FUNCTION_PREFIXES):
+            return False, f"function {name} is not allowed"
+
+    ctes = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    tables = {table.name for table in tree.find_all(exp.Table)} - ctes
+    unknown_tables = tables - SCHEMA_COLUMNS.keys()
+    if unknown_tables:
+        return False, f"unknown table {sorted(unknown_tables)[0]}"
+
+    known_columns = {alias.alias for alias in tree.find_all(exp.Alias)}
+    for table in tables:
+        known_columns |= SCHEMA_COLUMNS[table]
+    # t.* parses as a Column whose name is "*"; stars are always valid
+    unknown_columns = {
+        column.name for column in tree.find_all(exp.Column)
+        if not isinstance(column.this, exp.Star)
+    } - known_columns
+    if unknown_columns:
+        return False, f"unknown column {sorted(unknown_columns)[0]}"
+    return True, ""
+
+
+# Few-shot examples sent with the SQL prompt once the encoder is loaded
+SQL_FEW_SHOT_K = int(os.getenv("SQL_FEW_SHOT_K", "3"))
+_case_example_vectors = None
+
+
+def select_case_examples(query_encoder, query: str, table: Optional[str]) -> Tuple[int, ...]:
+    """The SQL_FEW_SHOT_K CASE_EXAMPLES for this table most similar to the query"""
+    global _case_example_vectors
+    if _case_example_vectors is None:
+        # Unit vectors (the encoder normalizes), so a dot product is cosine
+        _case_example_vectors = np.stack(
+            query_encoder.encode_many([example["q"] for example in CASE_EXAMPLES])
+        )
+
+    candidates = case_example_ids(table)
+    if len(candidates) <= SQL_FEW_SHOT_K:
+        return candidates
+    scores = _case_example_vectors[list(candidates)] @ query_encoder.encode(query)
+    best = heapq.nlargest(SQL_FEW_SHOT_K, range(len(candidates)), key=scores.__getitem__)
+    return tuple(sorted(candidates[i] for i in best))
+
+
+async def database_query_node(state: AgentState) -> AgentState:
     """Generate and execute SQL for target_list queries with improved name logic."""
     
-    state_copy = dict(state)
-    query = state_copy.get("user_query", "")
-    context = get_context_string(state_copy)
+    updates: Dict[str, Any] = {}
+    query = state.get("user_query", "")
+    context = get_context_string(state)
 
-    print(f"{'='*70}")
-    print(f"📊 DATABASE QUERY")
-    print(f"{'='*70}\n")
+    logger.info("📊 DATABASE QUERY")
 
    
-    tokens = [t.strip() for t in re.split(r'\s+', query) if len(t.strip()) > 1]
+    tokens = [t.strip() for t in _WHITESPACE.split(query) if len(t.strip()) > 1]
     tokens = [
         t for t in tokens
         if len(t) > 2 and t.lower() not in {"the", "in", "of", "for", "and", "to", "show", "all", "me"}
     ]
-    debug(f"Query tokens: {tokens}")
-    state_copy["query_tokens"] = tokens
+    logger.debug("Query tokens: %s", tokens)
+    updates["query_tokens"] = tokens
 
 
     def build_name_condition(name_tokens: List[str]) -> str:
@@ -632,14 +1154,39 @@ def database_query_node(state: AgentState) -> AgentState:
         # Detect if tokens are alphabetic (not numbers or SQL keywords)
         if all(t.isalpha() for t in tokens):
             name_condition = build_name_condition(tokens)
-            debug(f"Detected name condition: {name_condition}")
+            logger.debug("Detected name condition: %s", name_condition)
 
     
-    sql_prompt = f"""
+    logger.debug("Generating SQL for database query")
+
+  
+    try:
+        sql = None
+        sql_key = None
+        table = sql_schema_table(query)
+        example_ids = None
+        # Like the classifier cache, only once the encoder is loaded
+        query_encoder = _query_encoder
+        if query_encoder is not None:
+            sql_key = await asyncio.to_thread(
+                context_cache_key, query_encoder, query, state.get("conversation_history", [])
+            )
+            cached_sql = sql_cache.lookup(sql_key)
+            if cached_sql is not None and sql_literals_match(cached_sql, query):
+                logger.debug("SQL cache hit")
+                sql = cached_sql
+                sql_key = None
+            else:
+                example_ids = await asyncio.to_thread(
+                    select_case_examples, query_encoder, query, table
+                )
+
+        if sql is None:
+            sql_prompt = f"""
 Generate a PostgreSQL SELECT query for this request.
 
 SCHEMA:
-{SCHEMA_CONTEXT}
+{get_schema_context(table, example_ids)}
 
 CONTEXT:
 {context}
@@ -663,209 +1210,168 @@ If "{query}" is a name lookup:
 
 ONLY return a valid SQL query.
 """
+            response = await model.generate_content_async(sql_prompt)
+            sql = clean_sql(response.text)
+            logger.debug("Generated SQL:\n%s", sql)
 
-    debug("Generating SQL for database query")
-
-  
-    try:
-        response = model.generate_content(sql_prompt)
-        sql = clean_sql(response.text)
-        debug(f"Generated SQL:\n{sql}")
+        # Reject malformed or non-SELECT SQL without a database round trip
+        sql_ok, sql_problem = validate_sql(sql)
+        if not sql_ok:
+            updates["error_type"] = "parsing_error"
+            raise ValueError(f"Invalid SQL returned by LLM: {sql_problem}")
 
-        # Prevent empty/invalid SQL strings
-        if not sql.lower().startswith("select"):
-            raise Exception("Invalid SQL returned by LLM")
+        results = await asyncio.to_thread(execute_sql_query, sql)
+        updates["results"] = results
+        updates["results_count"] = len(results)
+        logger.debug("Database node returned %s rows", len(results))
 
-        results = execute_sql_query(sql)
-        state_copy["results"] = results
-        state_copy["results_count"] = len(results)
-        debug(f"Database node returned {len(results)} rows")
+        # Cache only SQL that executed
+        if sql_key is not None:
+            sql_cache.add(sql_key, sql)
 
     except Exception as e:
-        debug(f"Database node error: {e}")
-        state_copy["error"] = str(e)
-        state_copy["results"] = []
-        state_copy["results_count"] = 0
+        logger.error("Database node error: %s", e)
+        updates["error"] = str(e)
+        updates["results"] = []
+        updates["results_count"] = 0
 
-    print(f"{'='*70}\n")
-    return state_copy
+    return updates
 
 
 
 def version_query_node(state: AgentState) -> AgentState:
     """Fetch version metadata and calculate diffs"""
-    state_copy = dict(state)
-    version_num = state_copy.get("version_number")
-    version_range = state_copy.get("version_range")
+    updates: Dict[str, Any] = {}
+    version_num = state.get("version_number")
+    version_range = state.get("version_range")
     
-    print(f"{'='*70}")
-    print(f"📜 VERSION QUERY")
-    print(f"{'='*70}\n")
+    logger.info("📜 VERSION QUERY")
     
-    debug(f"version_num={version_num}, version_range={version_range}")
+    logger.debug("version_num=%s, version_range=%s", version_num, version_range)
     
     try:
         # PRIORITY 1: Version comparison (range)
         # CHECK THIS FIRST, BEFORE CHECKING version_num
         if version_range and len(version_range) == 2:
             v1, v2 = version_range
-            debug(f"🔄 COMPARISON MODE: v{v1} → v{v2}")
-            
-            sql = f"""
-            SELECT h1.version_number as v1_version, h1.total_rows as v1_total_rows,
-                   h1.changed_rows as v1_changed_rows, h1.operation_type as v1_operation,
-                   h2.version_number as v2_version, h2.total_rows as v2_total_rows,
-                   h2.changed_rows as v2_changed_rows, h2.operation_type as v2_operation,
-                   (h2.total_rows - h1.total_rows) as row_difference,
-                   h2.reason, h2.triggered_by, h2.timestamp, h2.doc_id, h2.filename
-            FROM public.history_table h1
-            JOIN public.history_table h2 ON h1.table_name = h2.table_name
-            WHERE h1.version_number = {v1} AND h2.version_number = {v2}
-            ORDER BY h2.timestamp DESC;
-            """
+            logger.debug("🔄 COMPARISON MODE: v%s → v%s", v1, v2)
             
-            results = execute_sql_query(sql)
-            state_copy["results"] = results
-            state_copy["results_count"] = len(results)
-            state_copy["is_comparison"] = True if results else False
-            debug(f"✅ Compared versions {v1} and {v2}: {len(results)} rows")
+            results = execute_sql_query(VERSION_COMPARISON_SQL, (int(v1), int(v2)))
+            updates["results"] = results
+            updates["results_count"] = len(results)
+            updates["is_comparison"] = True if results else False
+            logger.debug("✅ Compared versions %s and %s: %s rows", v1, v2, len(results))
             
             if not results:
-                state_copy["error"] = f"Could not compare versions {v1} and {v2}"
+                updates["error"] = f"Could not compare versions {v1} and {v2}"
         
         # PRIORITY 2: Single version
         elif version_num and not version_range:
-            debug(f"📌 SINGLE VERSION MODE: v{version_num}")
+            logger.debug("📌 SINGLE VERSION MODE: v%s", version_num)
             
-            sql = f"""
-            SELECT version_id, version_number, table_name, total_rows,
-                   changed_rows, operation_type, reason, triggered_by,
-                   timestamp, doc_id, filename, file_type, num_chunks
-            FROM public.history_table
-            WHERE version_number = {version_num}
-            ORDER BY timestamp DESC
-            LIMIT 10;
-            """
-            
-            results = execute_sql_query(sql)
-            state_copy["results"] = results
-            state_copy["results_count"] = len(results)
-            debug(f"✅ Fetched {len(results)} rows for version {version_num}")
+            results = execute_sql_query(VERSION_DETAIL_SQL, (int(version_num),))
+            updates["results"] = results
+            updates["results_count"] = len(results)
+            logger.debug("✅ Fetched %s rows for version %s", len(results), version_num)
             
             if not results:
-                state_copy["error"] = f"Version {version_num} not found"
+                updates["error"] = f"Version {version_num} not found"
         
         # PRIORITY 3: Latest versions (no version_num or version_range specified)
         else:
-            debug("📚 LATEST VERSIONS MODE")
-            
-            sql = """
-            SELECT version_id, version_number, table_name, total_rows,
-                   changed_rows, operation_type, reason, triggered_by,
-                   timestamp, doc_id, filename, file_type
-            FROM public.history_table
-            ORDER BY version_id DESC
-            LIMIT 5;
-            """
+            logger.debug("📚 LATEST VERSIONS MODE")
             
-            results = execute_sql_query(sql)
-            state_copy["results"] = results
-            state_copy["results_count"] = len(results)
-            debug(f"✅ Fetched latest versions: {len(results)} rows")
+            results = execute_sql_query(LATEST_VERSIONS_SQL)
+            updates["results"] = results
+            updates["results_count"] = len(results)
+            logger.debug("✅ Fetched latest versions: %s rows", len(results))
     
     except Exception as e:
-        debug(f"❌ Version query error: {e}")
-        state_copy["results"] = []
-        state_copy["results_count"] = 0
-        state_copy["error"] = str(e)
+        logger.error("❌ Version query error: %s", e)
+        updates["results"] = []
+        updates["results_count"] = 0
+        updates["error"] = str(e)
     
-    print(f"{'='*70}\n")
-    return state_copy
+    return updates
 
 
 
-def version_hybrid_node(state: AgentState) -> AgentState:
+async def version_hybrid_node(state: AgentState) -> AgentState:
     """Combine version metadata + Pinecone documents"""
-    state_copy = dict(state)
-    version_num = state_copy.get("version_number")
-    query = state_copy.get("user_query", "")
+    updates: Dict[str, Any] = {}
+    version_num = state.get("version_number")
+    query = state.get("user_query", "")
     
-    print(f"{'='*70}")
-    print(f"🔀 VERSION HYBRID SEARCH")
-    print(f"{'='*70}\n")
+    logger.info("🔀 VERSION HYBRID SEARCH")
     
-    debug(f"Version hybrid node called for version {version_num}")
+    logger.debug("Version hybrid node called for version %s", version_num)
     
-    if not PINECONE_AVAILABLE or not document_index or not embedding_model:
-        debug("Pinecone unavailable")
-        state_copy["results"] = []
-        state_copy["results_count"] = 0
-        state_copy["error"] = "Pinecone unavailable"
-        print(f"{'='*70}\n")
-        return state_copy
+    document_index = await asyncio.to_thread(get_document_index)
+    query_encoder = await asyncio.to_thread(get_query_encoder)
+    if document_index is None or query_encoder is None:
+        logger.debug("Pinecone unavailable")
+        updates["results"] = []
+        updates["results_count"] = 0
+        updates["error"] = "Pinecone unavailable"
+        return updates
     
     try:
         if not version_num:
-            state_copy["results"] = []
-            state_copy["error"] = "Version number required for hybrid search"
-            print(f"{'='*70}\n")
-            return state_copy
+            updates["results"] = []
+            updates["error"] = "Version number required for hybrid search"
+            return updates
         
         # Get version metadata
-        sql = f"""
-        SELECT version_id, version_number, table_name, total_rows,
-               changed_rows, operation_type, reason, triggered_by,
-               timestamp, doc_id, filename, file_type, num_chunks
-        FROM public.history_table
-        WHERE version_number = {version_num}
-        LIMIT 5;
-        """
-        
-        version_data = execute_sql_query(sql)
-        debug(f"Version metadata rows: {len(version_data)}")
+        # Fetch metadata and encode the query concurrently; the embedding
+        # does not depend on the SQL result, only the Pinecone filter does
+        version_data, q_emb = await asyncio.gather(
+            asyncio.to_thread(execute_sql_query, VERSION_HYBRID_SQL, (int(version_num),)),
+            asyncio.to_thread(lambda: query_encoder.encode(query).tolist())
+        )
+        logger.debug("Version metadata rows: %s", len(version_data))
         
         if not version_data:
-            state_copy["results"] = []
-            state_copy["error"] = f"Version {version_num} not found"
-            print(f"{'='*70}\n")
-            return state_copy
+            updates["results"] = []
+            updates["error"] = f"Version {version_num} not found"
+            return updates
         
         # Extract doc_ids
         doc_ids = [v.get("doc_id") for v in version_data if v.get("doc_id")]
-        debug(f"doc_ids linked to version {version_num}: {doc_ids}")
+        logger.debug("doc_ids linked to version %s: %s", version_num, doc_ids)
         
         if not doc_ids:
-            state_copy["results"] = {
+            updates["results"] = {
                 "version_metadata": version_data,
                 "document_matches": [],
                 "total_matches": 0
             }
-            state_copy["results_count"] = 0
-            print(f"{'='*70}\n")
-            return state_copy
+            updates["results_count"] = 0
+            return updates
         
         # Search Pinecone
-        q_emb = embedding_model.encode([query]).tolist()[0]
-        search_results = document_index.query(
+        search_results = await asyncio.to_thread(
+            document_index.query,
             vector=q_emb,
             top_k=15,
             filter={"doc_id": {"$in": doc_ids}},
             include_metadata=True
         )
         
-        debug(f"Pinecone matches: {len(search_results.get('matches', []))}")
+        logger.debug("Pinecone matches: %s", len(search_results.get('matches', [])))
         
-        # Group by document
+        # Group by document. Pinecone returns matches sorted by score, so
+        # insertion order is already best-match-first; no re-sort needed.
         doc_matches = {}
         for match in search_results.get("matches", []):
-            md = match.get("metadata", {})
+            md = match.get("metadata") or _EMPTY_METADATA
             doc_id = md.get("doc_id")
             
             if not doc_id:
                 continue
             
-            if doc_id not in doc_matches:
-                doc_matches[doc_id] = {
+            doc = doc_matches.get(doc_id)
+            if doc is None:
+                doc = doc_matches[doc_id] = {
                     "doc_id": doc_id,
                     "filename": md.get("filename", ""),
                     "uploader": md.get("uploader_name", ""),
@@ -876,146 +1382,334 @@ def version_hybrid_node(state: AgentState) -> AgentState:
                     "chunks": []
                 }
             
-            doc_matches[doc_id]["chunks"].append({
+            doc["chunks"].append({
                 "text": md.get("chunk_text", ""),
                 "similarity": match.get("score", 0)
             })
         
         doc_list = list(doc_matches.values())
-        state_copy["results"] = {
+        updates["results"] = {
             "version_metadata": version_data,
             "document_matches": doc_list,
             "total_matches": len(doc_list)
         }
-        state_copy["results_count"] = len(doc_list)
-        debug(f"Hybrid found {len(doc_list)} documents")
+        updates["results_count"] = len(doc_list)
+        logger.debug("Hybrid found %s documents", len(doc_list))
     
     except Exception as e:
-        debug(f"Version hybrid error: {e}")
-        state_copy["results"] = []
-        state_copy["results_count"] = 0
-        state_copy["error"] = str(e)
+        logger.error("Version hybrid error: %s", e)
+        updates["results"] = []
+        updates["results_count"] = 0
+        updates["error"] = str(e)
     
-    print(f"{'='*70}\n")
-    return state_copy
+    return updates
 
 
 
-def semantic_search_node(state: AgentState) -> AgentState:
-    """Search documents using vector embeddings"""
-    state_copy = dict(state)
-    query = state_copy.get("user_query", "")
-    uploader = state_copy.get("uploader_filter")
-    
-    print(f"{'='*70}")
-    print(f"🔍 SEMANTIC SEARCH")
-    print(f"{'='*70}\n")
+# Fan-out pool for searches that send several vectors to Pinecone at once
+PINECONE_QUERY_WORKERS = 8
+_pinecone_executor = ThreadPoolExecutor(
+    max_workers=PINECONE_QUERY_WORKERS, thread_name_prefix="pinecone-query"
+)
+
+
+# Two-phase search: rank documents from chunk ids/scores only, then re-query
+# with metadata restricted to the winning documents. Skips transferring
+# chunk_text for chunks that get cut, at the cost of a second round trip.
+SEMANTIC_TWO_PHASE = os.getenv("SEMANTIC_TWO_PHASE", "false").lower() == "true"
+
+
+def _query_top_documents(
+    document_index, vector: List[float], pinecone_filter: Optional[Dict] = None,
+    top_k: int = 30, top_docs: int = 5
+) -> List[Dict]:
+    """Return matches (with metadata) only for the top_docs documents by average score"""
+    search_results = document_index.query(
+        vector=vector,
+        top_k=top_k,
+        filter=pinecone_filter,
+        include_metadata=False
+    )
     
-    debug(f"Semantic search: {query}" + (f" (uploader: {uploader})" if uploader else ""))
+    # Chunk ids are "{doc_id}_chunk_{i}" (see routes/injection2.py)
+    scores = {}
+    for m in search_results.get("matches", []):
+        scores.setdefault(m["id"].rsplit("_chunk_", 1)[0], []).append(m.get("score", 0))
     
-    if not PINECONE_AVAILABLE or not document_index or not embedding_model:
-        debug("Pinecone unavailable")
-        state_copy["results"] = []
-        state_copy["results_count"] = 0
-        state_copy["error"] = "Vector search unavailable"
-        print(f"{'='*70}\n")
-        return state_copy
+    best = heapq.nlargest(top_docs, scores, key=lambda d: sum(scores[d]) / len(scores[d]))
+    if not best:
+        return []
     
-    try:
-        # Encode query
-        q_emb = embedding_model.encode([query]).tolist()[0]
-        debug("Query encoded")
-        
-        # Build filter if uploader specified
-        pinecone_filter = None
-        if uploader:
-            pinecone_filter = {"uploader_name": {"$eq": uploader}}
-            debug(f"Pinecone filter: {pinecone_filter}")
-        
-        # Search Pinecone
+    # Same vector, restricted to the winning documents: returns the same
+    # chunks phase one found for them, now with metadata
+    doc_filter = {"doc_id": {"$in": best}}
+    if pinecone_filter:
+        doc_filter = {"$and": [pinecone_filter, doc_filter]}
+    search_results = document_index.query(
+        vector=vector,
+        top_k=sum(len(scores[d]) for d in best),
+        filter=doc_filter,
+        include_metadata=True
+    )
+    return search_results.get("matches", [])
+
+
+def _pinecone_query_many(
+    document_index, vectors: List[List[float]], pinecone_filter: Optional[Dict] = None, top_k: int = 30
+) -> List[List[Dict]]:
+    """Run one Pinecone query per vector concurrently; returns match lists in input order"""
+    def run(vector):
+        if SEMANTIC_TWO_PHASE:
+            return _query_top_documents(document_index, vector, pinecone_filter, top_k)
         search_results = document_index.query(
-            vector=q_emb,
-            top_k=30,
+            vector=vector,
+            top_k=top_k,
             filter=pinecone_filter,
             include_metadata=True
         )
+        return search_results.get("matches", [])
+
+    if len(vectors) == 1:
+        return [run(vectors[0])]
+    return list(_pinecone_executor.map(run, vectors))
+
+
+def _group_matches(matches: List[Dict]) -> List[Dict]:
+    """Group chunk matches by document and return the top 5 by average similarity"""
+    # Pass 1: score sums and (score, metadata) pairs per document
+    grouped = {}
+    for m in matches:
+        md = m.get("metadata") or _EMPTY_METADATA
+        doc_id = md.get("doc_id")
         
-        matches = search_results.get("matches", [])
-        debug(f"Semantic search matches: {len(matches)}")
-        
-        if not matches:
-            state_copy["results"] = []
-            state_copy["results_count"] = 0
-            print(f"{'='*70}\n")
-            return state_copy
+        if not doc_id:
+            continue
         
-        # Group by document
-        docs = {}
-        for m in matches:
-            md = m.get("metadata", {})
-            doc_id = md.get("doc_id")
-            
-            if not doc_id:
-                continue
-            
-            if doc_id not in docs:
-                docs[doc_id] = {
-                    "doc_id": doc_id,
-                    "filename": md.get("filename", "Unknown"),
-                    "uploader": md.get("uploader_name", "Unknown"),
-                    "table_name": md.get("table_name", "Unknown"),
-                    "action": md.get("action", "Unknown"),
-                    "hcp_name": md.get("hcp_name", ""),
-                    "hcp_email": md.get("hcp_email", ""),
-                    "timestamp": md.get("timestamp", ""),
-                    "change_description": md.get("change_description", ""),
-                    "chunks": []
+        score = m.get("score", 0)
+        entry = grouped.get(doc_id)
+        if entry is None:
+            grouped[doc_id] = [score, [(score, md)]]
+        else:
+            entry[0] += score
+            entry[1].append((score, md))
+    
+    # Rank by average similarity; top 5 without a full sort
+    top = heapq.nlargest(5, grouped.items(), key=lambda kv: kv[1][0] / len(kv[1][1]))
+    
+    # Pass 2: build result dicts only for the documents that survive the cut
+    docs_list = []
+    for doc_id, (score_sum, doc_chunks) in top:
+        md = doc_chunks[0][1]
+        docs_list.append({
+            "doc_id": doc_id,
+            "filename": md.get("filename", "Unknown"),
+            "uploader": md.get("uploader_name", "Unknown"),
+            "table_name": md.get("table_name", "Unknown"),
+            "action": md.get("action", "Unknown"),
+            "hcp_name": md.get("hcp_name", ""),
+            "hcp_email": md.get("hcp_email", ""),
+            "timestamp": md.get("timestamp", ""),
+            "change_description": md.get("change_description", ""),
+            "chunks": [
+                {
+                    "text": chunk_md.get("chunk_text", ""),
+                    "similarity": score,
+                    "chunk_index": chunk_md.get("chunk_index", 0)
                 }
-            
-            docs[doc_id]["chunks"].append({
-                "text": md.get("chunk_text", ""),
-                "similarity": m.get("score", 0),
-                "chunk_index": md.get("chunk_index", 0)
-            })
+                for score, chunk_md in doc_chunks
+            ],
+            "avg_similarity": score_sum / len(doc_chunks)
+        })
+    
+    return docs_list
+
+
+def search_documents(queries: List[str], uploader: Optional[str] = None) -> List[List[Dict]]:
+    """
+    Semantic search for several queries sharing one uploader filter.
+    Cached queries are answered directly; the rest are encoded in one batch
+    and sent to Pinecone concurrently. Returns one docs list per query.
+    Raises RuntimeError when a query misses the cache and Pinecone is unavailable.
+    """
+    keys = [search_cache.make_key(q, uploader) for q in queries]
+    results: List[Optional[List[Dict]]] = [search_cache.get(k) for k in keys]
+    pending = [i for i, r in enumerate(results) if r is None]
+    logger.debug(
+        "Search cache: %s/%s hits (totals %s hits / %s misses)",
+        len(queries) - len(pending), len(queries), search_cache.hits, search_cache.misses
+    )
+    
+    if pending:
+        document_index = get_document_index()
+        query_encoder = get_query_encoder()
+        if document_index is None or query_encoder is None:
+            raise RuntimeError("Vector search unavailable")
         
-        # Sort by similarity
-        docs_list = list(docs.values())
-        for d in docs_list:
-            cs = d["chunks"]
-            d["avg_similarity"] = sum(c["similarity"] for c in cs) / len(cs) if cs else 0
+        vectors = query_encoder.encode_many([queries[i] for i in pending])
+        logger.debug("Queries encoded")
+        
+        # Build filter if uploader specified
+        pinecone_filter = None
+        if uploader:
+            pinecone_filter = {"uploader_name": {"$eq": uploader}}
+            logger.debug("Pinecone filter: %s", pinecone_filter)
         
-        docs_list.sort(key=lambda x: x["avg_similarity"], reverse=True)
-        docs_list = docs_list[:5]
+        # Pinecone's request models validate vector as List[float], so the
+        # ndarray has to become a list; tolist() does it in one C call
+        match_lists = _pinecone_query_many(
+            document_index, [v.tolist() for v in vectors], pinecone_filter
+        )
+        for i, matches in zip(pending, match_lists):
+            logger.debug("Semantic search matches: %s", len(matches))
+            docs_list = _group_matches(matches)
+            if docs_list:
+                search_cache.put(keys[i], docs_list)
+            results[i] = docs_list
+    
+    return [list(r) for r in results]
+
+
+def semantic_search_node(state: AgentState) -> AgentState:
+    """Search documents using vector embeddings"""
+    updates = {}
+    query = state.get("user_query", "")
+    uploader = state.get("uploader_filter")
+    
+    logger.info("🔍 SEMANTIC SEARCH")
+    
+    logger.debug("Semantic search: %s (uploader: %s)", query, uploader)
+    
+    try:
+        docs_list = search_documents([query], uploader)[0]
         
-        state_copy["results"] = docs_list
-        state_copy["results_count"] = len(docs_list)
-        debug(f"Returning {len(docs_list)} documents")
+        updates["results"] = docs_list
+        updates["results_count"] = len(docs_list)
+        logger.debug("Returning %s documents", len(docs_list))
     
     except Exception as e:
-        debug(f"Semantic search error: {e}")
-        state_copy["results"] = []
-        state_copy["results_count"] = 0
-        state_copy["error"] = str(e)
+        logger.error("Semantic search error: %s", e)
+        updates["results"] = []
+        updates["results_count"] = 0
+        updates["error"] = str(e)
     
-    print(f"{'='*70}\n")
-    return state_copy
+    return updates
+
+
+
+
+_EXAMPLE_QUERIES = "\n".join([
+    '- "Show me all HCPs in target list"',
+    '- "What changed in version 4?"',
+    '- "Compare version 3 and 5"',
+    '- "Search documents for quarterly"',
+])
+
+_GREETING_REPLY = f"""Hi! I can answer questions about the target list, its version history and uploaded documents.
+
+Try asking me things like:
+{_EXAMPLE_QUERIES}"""
+
+_THANKS_REPLY = "You're welcome! Ask me anything else about the target list, versions or documents."
 
+_HELP_REPLY = f"""I can look up records in the database, explain what changed between versions, and search uploaded documents.
 
+Try asking me things like:
+{_EXAMPLE_QUERIES}"""
+
+_OFF_TOPIC_REPLY = f"""That's outside what I can help with - I only know about this pharma database and its documents.
+
+Try asking me things like:
+{_EXAMPLE_QUERIES}"""
+
+# Common unclassifiable queries answered without an LLM round-trip
+CANNED_INVALID_REPLIES = {
+    "hi": _GREETING_REPLY,
+    "hello": _GREETING_REPLY,
+    "hey there": _GREETING_REPLY,
+    "good morning": _GREETING_REPLY,
+    "thanks": _THANKS_REPLY,
+    "thank you very much": _THANKS_REPLY,
+    "help": _HELP_REPLY,
+    "what can you do": _HELP_REPLY,
+    "how do I use this": _HELP_REPLY,
+    "what questions can I ask": _HELP_REPLY,
+    "what's the weather today": _OFF_TOPIC_REPLY,
+    "tell me a joke": _OFF_TOPIC_REPLY,
+    "who won the game last night": _OFF_TOPIC_REPLY,
+    "write me a poem": _OFF_TOPIC_REPLY,
+}
+CANNED_REPLY_THRESHOLD = 0.85
+_canned_reply_cache: Optional[SemanticCache] = None
+_NON_WORD = re.compile(r'[^\w\s]')
+
+
+def _canned_key(text: str) -> str:
+    """'Hello!' -> 'hello', so exact matches ignore case and punctuation"""
+    return " ".join(_NON_WORD.sub("", text.lower()).split())
+
+
+_CANNED_EXACT = {_canned_key(pattern): reply for pattern, reply in CANNED_INVALID_REPLIES.items()}
+
+
+def lookup_canned_reply(query: str) -> Optional[str]:
+    """Return a canned reply when the query is (close to) a known pattern"""
+    global _canned_reply_cache
+    exact = _CANNED_EXACT.get(_canned_key(query))
+    if exact is not None:
+        return exact
+    
+    # Only when the encoder is already loaded; not worth a model load here
+    query_encoder = _query_encoder
+    if query_encoder is None:
+        return None
+    
+    if _canned_reply_cache is None:
+        cache = SemanticCache(
+            threshold=CANNED_REPLY_THRESHOLD, max_entries=len(CANNED_INVALID_REPLIES)
+        )
+        patterns = list(CANNED_INVALID_REPLIES)
+        for pattern, vec in zip(patterns, query_encoder.encode_many(patterns)):
+            cache.add(vec, CANNED_INVALID_REPLIES[pattern])
+        _canned_reply_cache = cache
+    
+    return _canned_reply_cache.lookup(query_encoder.encode(query))
+
+
+# Gemini suggestions for invalid queries. Keys are blake2b digests of the
+# model name and prompt, so entries stay small and a model change misses;
+# the TTL bounds how long a reply outlives edits to the prompt template.
+suggestion_cache = QueryCache(
+    max_entries=int(os.getenv("SUGGESTION_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("SUGGESTION_CACHE_TTL", "3600")),
+)
+
+
+def generate_suggestion(prompt: str) -> str:
+    """Cleaned Gemini reply for an invalid-route prompt, memoized per prompt"""
+    key = hashlib.blake2b(
+        f"{model.model_name}\0{prompt}".encode(), digest_size=16
+    ).digest()
+    suggestion = suggestion_cache.get(key)
+    if suggestion is None:
+        suggestion = strip_markdown(generate_streamed(prompt).strip())
+        suggestion_cache.put(key, suggestion)
+    return suggestion
 
 
 def handle_invalid_route(state: AgentState) -> AgentState:
     """Handle queries that couldn't be classified"""
-    state_copy = dict(state)
+    logger.info("❌ UNABLE TO CLASSIFY QUERY")
     
-    print(f"\n{'='*70}")
-    print(f"❌ UNABLE TO CLASSIFY QUERY")
-    print(f"{'='*70}\n")
+    user_query = state.get("user_query", "")
+    routing_reason = state.get("routing_reason", "Unclear intent")
     
-    user_query = state_copy.get("user_query", "")
-    routing_reason = state_copy.get("routing_reason", "Unclear intent")
+    logger.info("Query: %s", user_query)
+    logger.info("Reason: %s", routing_reason)
     
-    print(f"Query: {user_query}")
-    print(f"Reason: {routing_reason}\n")
+    # The router already knows what went wrong; no suggestion needed
+    error = state.get("error")
+    if error:
+        return {"response": error, **memory_updates(state, error)}
     
     # Build helpful response with suggestions
     suggestion_prompt = f"""
@@ -1032,11 +1726,14 @@ Keep it conversational and friendly (2-3 sentences max).
 """
     
     try:
-        response = model.generate_content(suggestion_prompt)
-        helpful_message = response.text.strip()
-        helpful_message = helpful_message.replace("**", "").replace("__", "").replace("```", "")
-        state_copy["response"] = helpful_message
-        print(f"Suggestion:\n{helpful_message}\n")
+        canned = lookup_canned_reply(user_query)
+        if canned is not None:
+            logger.debug("Canned reply matched")
+            return {"response": canned, **memory_updates(state, canned)}
+        
+        helpful_message = generate_suggestion(suggestion_prompt)
+        response = helpful_message
+        logger.debug("Suggestion:\n%s", helpful_message)
     except:
         default_message = """I couldn't understand your query.
 
@@ -1048,52 +1745,46 @@ Try asking me things like:
 - "Search documents for quarterly"
 
 Please rephrase and try again!"""
-        state_copy["response"] = default_message
-        print(f"Response:\n{default_message}\n")
-    
-    # Save to memory even for invalid queries
-    state_copy = save_to_memory(state_copy)
+        response = default_message
+        logger.debug("Response:\n%s", default_message)
     
     # Ensure response is string
-    if not isinstance(state_copy.get("response"), str):
-        state_copy["response"] = json.dumps(state_copy["response"], default=str, indent=2)
+    if not isinstance(response, str):
+        response = _dumps(response)
     
-    print(f"{'='*70}\n")
-    
-    return state_copy
+    # Save to memory even for invalid queries
+    return {"response": response, **memory_updates(state, response)}
 
 
 
-def summarizer_node(state: AgentState) -> AgentState:
+def format_results(state: AgentState) -> Dict[str, Any]:
     """
     Format results into natural language based on route.
     """
 
-    state_copy = dict(state)
-    route = state_copy.get("route", "unknown")
-    results = state_copy.get("results", [])
-    query = state_copy.get("user_query", "")
-    error = state_copy.get("error")
-    results_count = state_copy.get("results_count", 0)
-    is_comparison = state_copy.get("is_comparison", False)
+    updates = {}
+    route = state.get("route", "unknown")
+    results = state.get("results", [])
+    query = state.get("user_query", "")
+    error = state.get("error")
+    results_count = state.get("results_count", 0)
+    is_comparison = state.get("is_comparison", False)
 
-    print(f"\n{'='*70}")
-    print(f"📝 SUMMARIZER - Route: {route.upper()}")
-    print(f"{'='*70}\n")
+    logger.info("📝 SUMMARIZER - Route: %s", route.upper())
 
     # Error case
     if error:
         response = f"❌ Error: {error}\n\nPlease try rephrasing your query."
-        state_copy["response"] = response
-        print(response)
-        return state_copy
+        updates["response"] = response
+        logger.debug("%s", response)
+        return updates
 
     # No results
     if not results or results_count == 0:
         response = "❌ No results found. Please try rephrasing your query."
-        state_copy["response"] = response
-        print(response)
-        return state_copy
+        updates["response"] = response
+        logger.debug("%s", response)
+        return updates
 
     # ───────────────────────────────────────────────────────────────
     # ROUTE: DATABASE ONLY
@@ -1102,7 +1793,7 @@ def summarizer_node(state: AgentState) -> AgentState:
         rows = results
 
         # 1) LLM Summary
-        data_for_llm = json.dumps(rows[:20], default=str, indent=2)
+        data_for_llm = _dumps(rows[:20])
 
         summarization_prompt = f"""
 You are a data analyst. The user asked: "{query}"
@@ -1119,15 +1810,14 @@ Summarize this data BRIEFLY in natural language:
 Keep it concise (3-5 sentences max). Be conversational, NOT a bullet list.
 """
 
-        debug(f"LLM summarizing {results_count} database rows")
+        logger.debug("LLM summarizing %s database rows", results_count)
 
         try:
-            llm_response = model.generate_content(summarization_prompt)
-            summary = llm_response.text.strip().replace("**", "").replace("__", "")
-            debug("LLM summary generated")
+            summary = strip_markdown(generate_streamed(summarization_prompt).strip())
+            logger.debug("LLM summary generated")
 
         except Exception as e:
-            debug(f"Summarization failed: {e}, using fallback")
+            logger.warning("Summarization failed: %s, using fallback", e)
             summary = fallback_summary(rows, results_count, query)
 
         # 2) Pretty formatting
@@ -1142,6 +1832,9 @@ Keep it concise (3-5 sentences max). Be conversational, NOT a bullet list.
             f"Total: {results_count} record(s)\n",
         ]
 
+        # Rows share the same columns; build each "   • Label: " prefix once
+        # (empty for the name columns, which go in the title instead)
+        prefixes = {}
         for i, row in enumerate(rows, 1):
             title = (
                 row.get("full_name")
@@ -1152,16 +1845,21 @@ Keep it concise (3-5 sentences max). Be conversational, NOT a bullet list.
             pretty.append(f"#{i} — {title}")
 
             for key, value in row.items():
-                if key.lower() in ["full_name", "hcp_name", "name"]:
-                    continue
-                pretty.append(f"   • {key.replace('_', ' ').title()}: {value}")
+                prefix = prefixes.get(key)
+                if prefix is None:
+                    prefix = prefixes[key] = (
+                        "" if key.lower() in ("full_name", "hcp_name", "name")
+                        else f"   • {key.replace('_', ' ').title()}: "
+                    )
+                if prefix:
+                    pretty.append(f"{prefix}{value}")
 
             pretty.append("")
 
         response = "\n".join(pretty)
-        state_copy["response"] = response
-        print(response)
-        return state_copy
+        updates["response"] = response
+        logger.debug("%s", response)
+        return updates
 
     # ───────────────────────────────────────────────────────────────
     # ROUTE: VERSION QUERY
@@ -1169,6 +1867,8 @@ Keep it concise (3-5 sentences max). Be conversational, NOT a bullet list.
     if route == "version_query":
         if is_comparison:
             comp = results[0]
+            filename = comp.get('filename')
+            document_line = f"📄 Document: {filename}" if filename else ""
             response = f"""
 📊 VERSION COMPARISON
 
@@ -1188,10 +1888,14 @@ CHANGES IN VERSION {comp.get('v2_version')}:
 REASON:
 {comp.get('reason', 'Not specified')}
 
-{f"📄 Document: {comp.get('filename')}" if comp.get('filename') else ""}
+{document_line}
 """
         else:
             v = results[0]
+            filename = v.get('filename')
+            num_chunks = v.get('num_chunks')
+            document_line = f"📄 Document: {filename}" if filename else ""
+            chunks_line = f"   Chunks: {num_chunks}" if num_chunks else ""
             response = f"""
 📜 VERSION {v.get('version_number')} DETAILS
 
@@ -1209,12 +1913,12 @@ INFO:
 REASON:
 {v.get('reason', 'Not specified')}
 
-{f"📄 Document: {v.get('filename')}" if v.get('filename') else ""}
-{f"   Chunks: {v.get('num_chunks')}" if v.get('num_chunks') else ""}
+{document_line}
+{chunks_line}
 """
-        state_copy["response"] = response
-        print(response)
-        return state_copy
+        updates["response"] = response
+        logger.debug("%s", response)
+        return updates
 
     # ───────────────────────────────────────────────────────────────
     # ROUTE: VERSION HYBRID
@@ -1255,7 +1959,8 @@ REASON:
                         response_parts.append(f"   Subject: {hcp_name}")
 
                     if chunks:
-                        best = max(chunks, key=lambda x: x.get("similarity", 0))
+                        # Chunks keep Pinecone's score order, best first
+                        best = chunks[0]
                         sim = int(best.get("similarity", 0) * 100)
                         text = best.get("text", "")[:800]
                         response_parts.append(f"   Match [{sim}%]: {text}...")
@@ -1267,9 +1972,9 @@ REASON:
         else:
             response = "Error formatting hybrid results."
 
-        state_copy["response"] = response
-        print(response)
-        return state_copy
+        updates["response"] = response
+        logger.debug("%s", response)
+        return updates
 
     # ───────────────────────────────────────────────────────────────
     # ROUTE: SEMANTIC SEARCH
@@ -1299,17 +2004,27 @@ REASON:
             parts.append("")
 
         response = "\n".join(parts)
-        state_copy["response"] = response
-        print(response)
-        return state_copy
+        updates["response"] = response
+        logger.debug("%s", response)
+        return updates
 
     # ───────────────────────────────────────────────────────────────
     # UNKNOWN ROUTE
     # ───────────────────────────────────────────────────────────────
     response = f"Unknown route: {route}. Please try rephrasing."
-    state_copy["response"] = response
-    print(response)
-    return state_copy
+    updates["response"] = response
+    logger.debug("%s", response)
+    return updates
+
+
+def summarizer_node(state: AgentState) -> AgentState:
+    """Write the reply for the route's results and record the turn"""
+    # INVALID_HANDLER already wrote (and recorded) the reply
+    if state.get("route") == "invalid" and state.get("response"):
+        return {}
+    updates = format_results(state)
+    updates.update(memory_updates(state, updates["response"]))
+    return updates
 
 
 def fallback_summary(rows: List[Dict], total_count: int, query: str) -> str:
@@ -1321,9 +2036,8 @@ def fallback_summary(rows: List[Dict], total_count: int, query: str) -> str:
     sample = rows[0]
 
     names = [
-        row.get("full_name") or row.get("hcp_name") or row.get("name")
-        for row in rows[:5]
-        if row.get("full_name") or row.get("hcp_name") or row.get("name")
+        name for row in rows[:5]
+        if (name := row.get("full_name") or row.get("hcp_name") or row.get("name"))
     ]
 
     summary_parts = []
@@ -1352,49 +2066,47 @@ def fallback_summary(rows: List[Dict], total_count: int, query: str) -> str:
 
 
 
-def execute_query(state: AgentState) -> AgentState:
+async def execute_query(state: AgentState) -> AgentState:
     """
     Complete workflow:
     query → route → execute → summarize → response
+
+    Synchronous nodes (Pinecone search, Gemini summaries) run in worker
+    threads so other requests keep using the event loop meanwhile.
     """
-    print(f"\n{'='*70}")
-    print(f"🚀 PROCESSING QUERY: {state.get('user_query', '')}")
-    print(f"{'='*70}\n")
+    logger.info("🚀 PROCESSING QUERY: %s", state.get('user_query', ''))
     
-    debug(f"Processing incoming query: {state.get('user_query', '')}")
+    logger.debug("Processing incoming query: %s", state.get('user_query', ''))
     
     # Step 1: Route
-    state = router_node(state)
+    state = merge_states(state, await router_node(state))
     
     # Step 2: Check if invalid - if so, return
     if state.get("route") == "invalid":
-        debug("Route is invalid, calling handle_invalid_route...")
-        state = handle_invalid_route(state)
+        logger.debug("Route is invalid, calling handle_invalid_route...")
+        state = merge_states(state, await asyncio.to_thread(handle_invalid_route, state))
         return state
     
     # Step 3: Execute based on valid route
     route = state.get("route")
     
     if route == "database_only":
-        state = database_query_node(state)
+        state = merge_states(state, await database_query_node(state))
     elif route == "version_query":
-        state = version_query_node(state)
+        state = merge_states(state, await asyncio.to_thread(version_query_node, state))
     elif route == "version_hybrid":
-        state = version_hybrid_node(state)
+        state = merge_states(state, await version_hybrid_node(state))
     elif route == "semantic_search":
-        state = semantic_search_node(state)
+        state = merge_states(state, await asyncio.to_thread(semantic_search_node, state))
     else:
-        debug(f"Unknown route: {route}")
+        logger.debug("Unknown route: %s", route)
         state["response"] = "An unexpected error occurred. Please try again."
         return state
     
-    # Step 4: Summarize results
-    state = summarizer_node(state)
-    
-    # Step 5: Save to memory
-    state = save_to_memory(state)
+    # Step 4: Summarize results (records the turn in conversation_history)
+    state = merge_states(state, await asyncio.to_thread(summarizer_node, state))
     
-    debug("Execution complete, returning response")
+    logger.debug("Execution complete, returning response")
     return state
 
 
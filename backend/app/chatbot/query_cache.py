@@ -0,0 +1,79 @@
+"""
+Query Cache - LRU + TTL cache for vector search results
+=======================================================
+Caches grouped semantic-search results per (query, uploader) so repeated
+questions skip the embedding forward pass and the Pinecone round-trip.
+
+Entries expire after ttl_seconds; the document upload/delete routes call
+invalidate() so new or removed documents show up immediately.
+
+response_cache holds whole chatbot answers; the CRUD, list and document
+write routes invalidate it so answers never outlive the data they read.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class QueryCache:
+    """Thread-safe LRU cache whose entries expire after a fixed TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # key -> (value, expiry), ordered from least to most recently used
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(query: str, uploader: Optional[str] = None) -> Tuple[str, str]:
+        """Normalize a search into a cache key"""
+        return (" ".join(query.lower().split()), (uploader or "").lower())
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Drop every entry (call after the vector index changes)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Shared by semantic_search_node and the document injection routes
+search_cache = QueryCache(
+    max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+)
+
+# Answers to repeated chatbot questions, so they skip the graph (LLM routing + SQL).
+# Cleared by every write route; the TTL covers writes made outside this API.
+response_cache = QueryCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+)
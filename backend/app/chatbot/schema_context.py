@@ -1,6 +1,12 @@
+import functools
+import re
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
 
+# The SQL prompt is assembled from fragments, each sent at most once:
+# what the platform is, the table definitions, and the SQL case types.
+# Table-specific fragments let callers send only the table they query.
 
-SCHEMA_CONTEXT = """
+_SYSTEM_OVERVIEW = """
 ================================================================
 🧠 SYSTEM OVERVIEW
 ================================================================
@@ -79,147 +85,167 @@ This overview helps the SQL generator:
 END OF SYSTEM OVERVIEW
 ================================================================
 
+"""
+
+_TABLES_HEADER = """
 ================================================================
 🏗️ CORE TABLES AND THEIR PURPOSES
 ================================================================
-DATABASE SCHEMA + SQL INSTRUCTIONS CONTEXT
-==========================================
-
-You are given two PostgreSQL tables: target_list and history_table.
-Use them to generate ONLY PostgreSQL SELECT queries based on user requests.
-
-
-{
-  "tables": {
-    "target_list": {
-      "description": "Main HCP data table containing doctor records.",
-      "columns": {
-        "hcp_id": {
-          "type": "integer",
-          "synonyms": ["id", "doctor id", "hcp code", "code", "unique id"],
-          "meaning": "Unique identifier for an HCP"
-        },
-        "full_name": {
-          "type": "text",
-          "synonyms": ["name", "doctor name", "hcp name", "physician name"],
-          "meaning": "Full name of the HCP"
-        },
-        "specialty": {
-          "type": "text",
-          "synonyms": ["department", "specialisation", "field", "practice area"],
-          "meaning": "Medical specialty of the HCP"
-        },
-        "email": {
-          "type": "text",
-          "synonyms": ["email id", "mail", "email address"],
-          "meaning": "Email address of the HCP"
-        },
-        "phone": {
-          "type": "text",
-          "synonyms": ["contact", "phone number", "mobile number"],
-          "meaning": "Phone number of the HCP"
-        },
-        "city": {
-          "type": "text",
-          "synonyms": ["location", "place", "area"],
-          "meaning": "City where the HCP practices"
-        }
-      },
-      "natural_queries": [
-        "Show all HCPs",
-        "How many doctors?",
-        "List all records in target list",
-        "Count entries in target list"
-      ]
-    },
-
-    "history_table": {
-      "description": "Version control table tracking every change to target_list.",
-      "columns": {
-        "version_id": {
-          "type": "integer",
-          "synonyms": ["vid", "version id", "internal id"],
-          "meaning": "Primary key for version history entries"
-        },
-        "version_number": {
-          "type": "integer",
-          "synonyms": ["version", "v", "ver", "v number"],
-          "meaning": "Version number of the update"
-        },
-        "operation_type": {
-          "type": "text",
-          "synonyms": ["operation", "type", "insert or delete", "what happened", "change type"],
-          "meaning": "INSERT, UPDATE, or DELETE"
-        },
-        "table_name": {
-          "type": "text",
-          "synonyms": ["table", "target table"],
-          "meaning": "Name of the table affected (usually target_list)"
-        },
-        "total_rows": {
-          "type": "integer",
-          "synonyms": [
-            "total", "total records", "total entries", "row count", 
-            "number of rows", "how many rows", "count", "size"
-          ],
-          "meaning": "Total number of rows in the table after the version update"
-        },
-        "changed_rows": {
-          "type": "integer",
-          "synonyms": [
-            "changes", "modified rows", "updated rows", "how many changed", 
-            "difference", "rows affected"
-          ],
-          "meaning": "Number of rows changed in this version"
-        },
-        "reason": {
-          "type": "text",
-          "synonyms": ["why", "reason for change", "explanation", "cause"],
-          "meaning": "Reason for the change as provided by the system or user"
-        },
-        "triggered_by": {
-          "type": "text",
-          "synonyms": ["who updated", "who changed", "user", "performed by", "updated by"],
-          "meaning": "Name of the person/system that made the change"
-        },
-        "timestamp": {
-          "type": "timestamp",
-          "synonyms": ["when", "date", "time", "when updated", "update time"],
-          "meaning": "When the version update was performed"
-        },
-        "doc_id": {
-          "type": "text",
-          "synonyms": ["document id", "doc id", "file id"],
-          "meaning": "Identifier of the document related to this version"
-        },
-        "filename": {
-          "type": "text",
-          "synonyms": ["file", "document", "doc name", "file name"],
-          "meaning": "Name of the document that triggered the version change"
+Use the PostgreSQL tables below to generate ONLY PostgreSQL SELECT queries based on user requests.
+
+COLUMN DICTIONARY (column:type  # words users may say — meaning)
+"""
+
+# Column dictionary: types, the words users say for each column, and
+# sample questions. Rendered into the prompt and used by match_columns().
+SCHEMA_DICT: Dict[str, Any] = {
+    "tables": {
+        "target_list": {
+            "description": "Main HCP data table containing doctor records.",
+            "columns": {
+                "hcp_id": {
+                    "type": "integer",
+                    "synonyms": ["id", "doctor id", "hcp code", "code", "unique id"],
+                    "meaning": "Unique identifier for an HCP"
+                },
+                "full_name": {
+                    "type": "text",
+                    "synonyms": ["name", "doctor name", "hcp name", "physician name"],
+                    "meaning": "Full name of the HCP"
+                },
+                "specialty": {
+                    "type": "text",
+                    "synonyms": ["department", "specialisation", "field", "practice area"],
+                    "meaning": "Medical specialty of the HCP"
+                },
+                "email": {
+                    "type": "text",
+                    "synonyms": ["email id", "mail", "email address"],
+                    "meaning": "Email address of the HCP"
+                },
+                "phone": {
+                    "type": "text",
+                    "synonyms": ["contact", "phone number", "mobile number"],
+                    "meaning": "Phone number of the HCP"
+                },
+                "city": {
+                    "type": "text",
+                    "synonyms": ["location", "place", "area"],
+                    "meaning": "City where the HCP practices"
+                },
+            },
+            "natural_queries": [
+                "Show all HCPs",
+                "How many doctors?",
+                "List all records in target list",
+                "Count entries in target list",
+            ]
         },
-        "file_type": {
-          "type": "text",
-          "synonyms": ["file extension", "type", "doc type"],
-          "meaning": "Type of file (e.g., .pdf, .docx)"
+        "history_table": {
+            "description": "Version control table tracking every change to target_list.",
+            "columns": {
+                "version_id": {
+                    "type": "integer",
+                    "synonyms": ["vid", "version id", "internal id"],
+                    "meaning": "Primary key for version history entries"
+                },
+                "version_number": {
+                    "type": "integer",
+                    "synonyms": ["version", "v", "ver", "v number"],
+                    "meaning": "Version number of the update"
+                },
+                "operation_type": {
+                    "type": "text",
+                    "synonyms": [
+                        "operation", "type", "insert or delete", "what happened",
+                        "change type"
+                    ],
+                    "meaning": "INSERT, UPDATE, or DELETE"
+                },
+                "table_name": {
+                    "type": "text",
+                    "synonyms": ["table", "target table"],
+                    "meaning": "Name of the table affected (usually target_list)"
+                },
+                "total_rows": {
+                    "type": "integer",
+                    "synonyms": [
+                        "total", "total records", "total entries", "row count",
+                        "number of rows", "how many rows", "count", "size"
+                    ],
+                    "meaning": "Total number of rows in the table after the version update"
+                },
+                "changed_rows": {
+                    "type": "integer",
+                    "synonyms": [
+                        "changes", "modified rows", "updated rows", "how many changed",
+                        "difference", "rows affected"
+                    ],
+                    "meaning": "Number of rows changed in this version"
+                },
+                "reason": {
+                    "type": "text",
+                    "synonyms": ["why", "reason for change", "explanation", "cause"],
+                    "meaning": "Reason for the change as provided by the system or user"
+                },
+                "triggered_by": {
+                    "type": "text",
+                    "synonyms": [
+                        "who updated", "who changed", "user", "performed by", "updated by"
+                    ],
+                    "meaning": "Name of the person/system that made the change"
+                },
+                "timestamp": {
+                    "type": "timestamp",
+                    "synonyms": ["when", "date", "time", "when updated", "update time"],
+                    "meaning": "When the version update was performed"
+                },
+                "doc_id": {
+                    "type": "text",
+                    "synonyms": ["document id", "doc id", "file id"],
+                    "meaning": "Identifier of the document related to this version"
+                },
+                "filename": {
+                    "type": "text",
+                    "synonyms": ["file", "document", "doc name", "file name"],
+                    "meaning": "Name of the document that triggered the version change"
+                },
+                "file_type": {
+                    "type": "text",
+                    "synonyms": ["file extension", "type", "doc type"],
+                    "meaning": "Type of file (e.g., .pdf, .docx)"
+                },
+                "num_chunks": {
+                    "type": "integer",
+                    "synonyms": ["chunks", "number of chunks", "vector chunks"],
+                    "meaning": "How many vector chunks were created for the document"
+                },
+            },
+            "natural_queries": [
+                "What changed in version X?",
+                "How many rows in version 5?",
+                "Explain version 10",
+                "Compare version 4 and version 9",
+                "Why was version 8 updated?",
+            ]
         },
-        "num_chunks": {
-          "type": "integer",
-          "synonyms": ["chunks", "number of chunks", "vector chunks"],
-          "meaning": "How many vector chunks were created for the document"
-        }
-      },
-      "natural_queries": [
-        "What changed in version X?",
-        "How many rows in version 5?",
-        "Explain version 10",
-        "Compare version 4 and version 9",
-        "Why was version 8 updated?"
-      ]
     }
-  }
 }
 
 
+def _format_column_dictionary(table: str) -> str:
+    """One "column:type  # synonyms — meaning" line per column"""
+    spec = SCHEMA_DICT["tables"][table]
+    lines = [f"{table}: {spec['description']}"]
+    for column, col in spec["columns"].items():
+        lines.append(
+            f"  {column}:{col['type']}  # {', '.join(col['synonyms'])} — {col['meaning']}"
+        )
+    lines.append("  e.g. " + " | ".join(spec["natural_queries"]))
+    return "\n".join(lines)
+
+
+_TARGET_LIST_DDL = """
 ------------------------------------------------
 TABLE: target_list
 ------------------------------------------------
@@ -257,8 +283,9 @@ Representative Rows:
 1 | HCP001 | Dr. Rohan Mehta | male | Cardiology | Senior Consultant | Noida | UP | 12 yrs | 4.80 | A | 120000 | 1450000 | 2024-10-15 | 3 | true
 2 | HCP002 | Dr. Sneha Kapoor | female | Gynecology | Consultant | Delhi | Delhi | 8 yrs | 4.30 | B | 70000 | 820000 | 2024-09-25 | 2 | false
 51 | NULL | Karan Malhotra | male | Psychiatry | Consultant | NIMHANS | NULL | 8 yrs | 4.20 | NULL | 60000 | 720000 | 2024-10-02 | NULL | true
+"""
 
-
+_HISTORY_TABLE_DDL = """
 ------------------------------------------------
 TABLE: history_table
 ------------------------------------------------
@@ -284,8 +311,9 @@ Columns:
 Representative Rows:
 1 | 1 | DELETE | target_list | 14 | 1 | Manual delete: Dr. Vivek Sinha | Administrator | 2025-11-16
 2 | 2 | DELETE | target_list | 12 | 2 | Manual bulk delete (2 HCPs)    | Administrator | 2025-11-16
+"""
 
-
+_CASE_TYPES_HEADER = """
 ================================================
 SQL QUERY LOGIC & CASE TYPES
 ================================================
@@ -296,131 +324,99 @@ NOTE:
 - ALWAYS produce PostgreSQL SELECT queries only.
 - NEVER modify data.
 - NEVER hallucinate columns.
+"""
 
-------------------------------------------------
-CASE TYPE 1: SIMPLE RETRIEVAL
-------------------------------------------------
-User intent: "show", "list", "display", "get all"
-
-Examples:
-Q: Show all HCPs.
-SQL:
-SELECT * FROM target_list;
-
-Q: Show names and emails.
-SQL:
-SELECT full_name, email FROM target_list;
-
-
-------------------------------------------------
-CASE TYPE 2: FILTERED QUERIES
-------------------------------------------------
-User intent: "where", "with", "having", "greater than", "less than"
+# Case types 1-5 and 7 query target_list; case type 6 queries history_table
+# case number -> (title, user-intent keywords, table it queries)
+_CASE_TYPES: Dict[int, Tuple[str, Optional[str], str]] = {
+    1: ("SIMPLE RETRIEVAL", '"show", "list", "display", "get all"', "target_list"),
+    2: ("FILTERED QUERIES", '"where", "with", "having", "greater than", "less than"', "target_list"),
+    3: ("SORTING & LIMITING", '"top", "highest", "lowest", "sorted"', "target_list"),
+    4: ("AGGREGATION / GROUPING",
+        '"count", "total", "sum", "average", "group by", "distribution"', "target_list"),
+    5: ("DATE-BASED QUERIES",
+        '"recent", "before", "after", "latest", "recently contacted"', "target_list"),
+    6: ("HISTORY / VERSION QUERIES",
+        '"versions", "history", "logs", "deletions", "changes", "audit"', "history_table"),
+    7: ("COMPLEX MULTI-CONDITION", None, "target_list"),
+}
 
-Examples:
-Q: Doctors with influence score > 4.5.
-SQL:
-SELECT full_name, specialty, influence_score
+# Few-shot examples in case order; the SQL node sends either all of a
+# table's examples or only the ones most similar to the question
+CASE_EXAMPLES: List[Dict[str, Any]] = [
+    {"case": 1, "q": "Show all HCPs.", "sql": "SELECT * FROM target_list;"},
+    {"case": 1, "q": "Show names and emails.", "sql": "SELECT full_name, email FROM target_list;"},
+    {"case": 2, "q": "Doctors with influence score > 4.5.", "sql": """SELECT full_name, specialty, influence_score
 FROM target_list
-WHERE influence_score > 4.5;
-
-Q: Female HCPs from Delhi.
-SQL:
-SELECT full_name, gender, city
+WHERE influence_score > 4.5;"""},
+    {"case": 2, "q": "Female HCPs from Delhi.", "sql": """SELECT full_name, gender, city
 FROM target_list
-WHERE gender = 'female' AND city = 'Delhi';
-
-
-------------------------------------------------
-CASE TYPE 3: SORTING & LIMITING
-------------------------------------------------
-User intent: "top", "highest", "lowest", "sorted"
-
-Examples:
-Q: Top 5 doctors by yearly sales.
-SQL:
-SELECT full_name, yearly_sales
+WHERE gender = 'female' AND city = 'Delhi';"""},
+    {"case": 3, "q": "Top 5 doctors by yearly sales.", "sql": """SELECT full_name, yearly_sales
 FROM target_list
 ORDER BY yearly_sales DESC
-LIMIT 5;
-
-
-------------------------------------------------
-CASE TYPE 4: AGGREGATION / GROUPING
-------------------------------------------------
-User intent: "count", "total", "sum", "average", "group by", "distribution"
-
-Examples:
-Q: Total yearly sales per specialty.
-SQL:
-SELECT specialty, SUM(yearly_sales) AS total_yearly_sales
+LIMIT 5;"""},
+    {"case": 4, "q": "Total yearly sales per specialty.", "sql": """SELECT specialty, SUM(yearly_sales) AS total_yearly_sales
 FROM target_list
-GROUP BY specialty;
-
-Q: Count of HCPs by city.
-SQL:
-SELECT city, COUNT(*) AS count
+GROUP BY specialty;"""},
+    {"case": 4, "q": "Count of HCPs by city.", "sql": """SELECT city, COUNT(*) AS count
 FROM target_list
-GROUP BY city;
-
-
-------------------------------------------------
-CASE TYPE 5: DATE-BASED QUERIES
-------------------------------------------------
-User intent: "recent", "before", "after", "latest", "recently contacted"
-
-Examples:
-Q: HCPs contacted after Oct 1 2024.
-SQL:
-SELECT full_name, last_interaction_date
+GROUP BY city;"""},
+    {"case": 5, "q": "HCPs contacted after Oct 1 2024.", "sql": """SELECT full_name, last_interaction_date
 FROM target_list
-WHERE last_interaction_date > '2024-10-01';
-
-Q: 5 most recent interactions.
-SQL:
-SELECT full_name, last_interaction_date
+WHERE last_interaction_date > '2024-10-01';"""},
+    {"case": 5, "q": "5 most recent interactions.", "sql": """SELECT full_name, last_interaction_date
 FROM target_list
 ORDER BY last_interaction_date DESC
-LIMIT 5;
-
-
-------------------------------------------------
-CASE TYPE 6: HISTORY / VERSION QUERIES
-------------------------------------------------
-User intent: "versions", "history", "logs", "deletions", "changes", "audit"
-
-Examples:
-Q: Show all delete operations in target_list.
-SQL:
-SELECT *
+LIMIT 5;"""},
+    {"case": 6, "q": "Show all delete operations in target_list.", "sql": """SELECT *
 FROM history_table
 WHERE table_name = 'target_list'
   AND operation_type = 'DELETE'
-ORDER BY timestamp DESC;
-
-Q: Latest version update.
-SQL:
-SELECT *
+ORDER BY timestamp DESC;"""},
+    {"case": 6, "q": "Latest version update.", "sql": """SELECT *
 FROM history_table
 WHERE table_name = 'target_list'
 ORDER BY version_number DESC
-LIMIT 1;
-
-
-------------------------------------------------
-CASE TYPE 7: COMPLEX MULTI-CONDITION
-------------------------------------------------
-Examples:
-Q: Female consultants with influence > 4.5 in Delhi.
-SQL:
-SELECT full_name, specialty, influence_score
+LIMIT 1;"""},
+    {"case": 7, "q": "Female consultants with influence > 4.5 in Delhi.", "sql": """SELECT full_name, specialty, influence_score
 FROM target_list
 WHERE gender = 'female'
   AND influence_score > 4.5
   AND city = 'Delhi'
-  AND designation LIKE '%Consultant%';
+  AND designation LIKE '%Consultant%';"""},
+]
+
+_RULE = "------------------------------------------------"
+
+
+def case_example_ids(table: Optional[str] = None) -> Tuple[int, ...]:
+    """Indexes into CASE_EXAMPLES for one table, or for both when table is None"""
+    return tuple(
+        i for i, example in enumerate(CASE_EXAMPLES)
+        if table is None or _CASE_TYPES[example["case"]][2] == table
+    )
 
 
+def _format_cases(example_ids: Tuple[int, ...]) -> str:
+    """Case-type blocks holding the given examples, in case order"""
+    by_case: Dict[int, List[Dict[str, Any]]] = {}
+    for i in sorted(example_ids):
+        by_case.setdefault(CASE_EXAMPLES[i]["case"], []).append(CASE_EXAMPLES[i])
+
+    blocks = []
+    for case in sorted(by_case):
+        title, intent, _ = _CASE_TYPES[case]
+        lines = [_RULE, f"CASE TYPE {case}: {title}", _RULE]
+        if intent:
+            lines += [f"User intent: {intent}", ""]
+        lines.append("Examples:")
+        lines.append("\n\n".join(f"Q: {ex['q']}\nSQL:\n{ex['sql']}" for ex in by_case[case]))
+        blocks.append("\n".join(lines))
+    return "\n\n\n".join(blocks) + "\n"
+
+
+_SPECIAL_RULES = """
 ------------------------------------------------
 CASE TYPE 8: SPECIAL RULES
 ------------------------------------------------
@@ -435,227 +431,82 @@ CASE TYPE 8: SPECIAL RULES
 ================================================
 END OF SCHEMA CONTEXT
 ================================================
-DATABASE SCHEMA + SQL INSTRUCTIONS CONTEXT
-==========================================
-
-You are given two PostgreSQL tables: target_list and history_table.
-Use them to generate ONLY PostgreSQL SELECT queries based on user requests.
-
-------------------------------------------------
-TABLE: target_list
-------------------------------------------------
-Description:
-Stores detailed information about Healthcare Professionals (HCPs), including
-name, specialty, hospital details, influence score, experience, sales, 
-interaction data, and priority classification.
-
-Columns:
-- id                       SERIAL PRIMARY KEY
-- hcp_code                 TEXT UNIQUE
-- full_name                TEXT NOT NULL
-- gender                   TEXT CHECK (male/female/other)
-- qualification            TEXT
-- specialty                TEXT
-- designation              TEXT
-- email                    TEXT
-- phone                    TEXT
-- hospital_name            TEXT
-- hospital_address         TEXT
-- city                     TEXT
-- state                    TEXT
-- pincode                  TEXT
-- experience_years         INTEGER
-- influence_score          NUMERIC(5,2)
-- category                 TEXT
-- therapy_area             TEXT
-- monthly_sales            INTEGER
-- yearly_sales             INTEGER
-- last_interaction_date    DATE
-- call_frequency           INTEGER
-- priority                 BOOLEAN DEFAULT FALSE
-
-Representative Rows:
-1 | HCP001 | Dr. Rohan Mehta | male | Cardiology | Senior Consultant | Noida | UP | 12 yrs | 4.80 | A | 120000 | 1450000 | 2024-10-15 | 3 | true
-2 | HCP002 | Dr. Sneha Kapoor | female | Gynecology | Consultant | Delhi | Delhi | 8 yrs | 4.30 | B | 70000 | 820000 | 2024-09-25 | 2 | false
-51 | NULL | Karan Malhotra | male | Psychiatry | Consultant | NIMHANS | NULL | 8 yrs | 4.20 | NULL | 60000 | 720000 | 2024-10-02 | NULL | true
-
-
-------------------------------------------------
-TABLE: history_table
-------------------------------------------------
-Description:
-Version log storing audit information for INSERT, UPDATE, DELETE operations
-performed on any table. Primarily tracks target_list changes.
-
-Columns:
-- version_id        BIGSERIAL PRIMARY KEY
-- version_number    INTEGER NOT NULL
-- operation_type    TEXT CHECK ('INSERT','UPDATE','DELETE')
-- table_name        TEXT NOT NULL
-- total_rows        INTEGER
-- changed_rows      INTEGER
-- reason            TEXT
-- triggered_by      TEXT DEFAULT 'Administrator'
-- timestamp         TIMESTAMP DEFAULT NOW()
-- doc_id            TEXT
-- filename          TEXT
-- file_type         TEXT
-- num_chunks        INTEGER
-
-Representative Rows:
-1 | 1 | DELETE | target_list | 14 | 1 | Manual delete: Dr. Vivek Sinha | Administrator | 2025-11-16
-2 | 2 | DELETE | target_list | 12 | 2 | Manual bulk delete (2 HCPs)    | Administrator | 2025-11-16
-
-
-================================================
-SQL QUERY LOGIC & CASE TYPES
-================================================
-
-You must classify the user's request into one of the following SQL categories and generate the matching query.
-
-NOTE:
-- ALWAYS produce PostgreSQL SELECT queries only.
-- NEVER modify data.
-- NEVER hallucinate columns.
-
-------------------------------------------------
-CASE TYPE 1: SIMPLE RETRIEVAL
-------------------------------------------------
-User intent: "show", "list", "display", "get all"
-
-Examples:
-Q: Show all HCPs.
-SQL:
-SELECT * FROM target_list;
-
-Q: Show names and emails.
-SQL:
-SELECT full_name, email FROM target_list;
-
-
-------------------------------------------------
-CASE TYPE 2: FILTERED QUERIES
-------------------------------------------------
-User intent: "where", "with", "having", "greater than", "less than"
-
-Examples:
-Q: Doctors with influence score > 4.5.
-SQL:
-SELECT full_name, specialty, influence_score
-FROM target_list
-WHERE influence_score > 4.5;
-
-Q: Female HCPs from Delhi.
-SQL:
-SELECT full_name, gender, city
-FROM target_list
-WHERE gender = 'female' AND city = 'Delhi';
-
-
-------------------------------------------------
-CASE TYPE 3: SORTING & LIMITING
-------------------------------------------------
-User intent: "top", "highest", "lowest", "sorted"
-
-Examples:
-Q: Top 5 doctors by yearly sales.
-SQL:
-SELECT full_name, yearly_sales
-FROM target_list
-ORDER BY yearly_sales DESC
-LIMIT 5;
-
-
-------------------------------------------------
-CASE TYPE 4: AGGREGATION / GROUPING
-------------------------------------------------
-User intent: "count", "total", "sum", "average", "group by", "distribution"
+"""
 
-Examples:
-Q: Total yearly sales per specialty.
-SQL:
-SELECT specialty, SUM(yearly_sales) AS total_yearly_sales
-FROM target_list
-GROUP BY specialty;
+# table name -> DDL fragment
+_TABLE_DDL = {
+    "target_list": _TARGET_LIST_DDL,
+    "history_table": _HISTORY_TABLE_DDL,
+}
 
-Q: Count of HCPs by city.
-SQL:
-SELECT city, COUNT(*) AS count
-FROM target_list
-GROUP BY city;
 
+_DDL_COLUMN = re.compile(r"^- (\w+)\s", re.MULTILINE)
 
-------------------------------------------------
-CASE TYPE 5: DATE-BASED QUERIES
-------------------------------------------------
-User intent: "recent", "before", "after", "latest", "recently contacted"
 
-Examples:
-Q: HCPs contacted after Oct 1 2024.
-SQL:
-SELECT full_name, last_interaction_date
-FROM target_list
-WHERE last_interaction_date > '2024-10-01';
+def _build_synonym_map() -> Dict[str, List[Tuple[str, str]]]:
+    synonyms: Dict[str, List[Tuple[str, str]]] = {}
 
-Q: 5 most recent interactions.
-SQL:
-SELECT full_name, last_interaction_date
-FROM target_list
-ORDER BY last_interaction_date DESC
-LIMIT 5;
-
-
-------------------------------------------------
-CASE TYPE 6: HISTORY / VERSION QUERIES
-------------------------------------------------
-User intent: "versions", "history", "logs", "deletions", "changes", "audit"
+    def add(word: str, table: str, column: str) -> None:
+        targets = synonyms.setdefault(word.lower(), [])
+        if (table, column) not in targets:
+            targets.append((table, column))
 
-Examples:
-Q: Show all delete operations in target_list.
-SQL:
-SELECT *
-FROM history_table
-WHERE table_name = 'target_list'
-  AND operation_type = 'DELETE'
-ORDER BY timestamp DESC;
+    for table, spec in SCHEMA_DICT["tables"].items():
+        for column, col in spec["columns"].items():
+            for word in (column, *col["synonyms"]):
+                add(word, table, column)
+    # Every DDL column too, as written and with spaces ("yearly sales")
+    for table, ddl in _TABLE_DDL.items():
+        for column in _DDL_COLUMN.findall(ddl):
+            add(column, table, column)
+            add(column.replace("_", " "), table, column)
+    return synonyms
 
-Q: Latest version update.
-SQL:
-SELECT *
-FROM history_table
-WHERE table_name = 'target_list'
-ORDER BY version_number DESC
-LIMIT 1;
 
+# synonym or column name -> every (table, column) it can refer to
+SYNONYM_MAP = _build_synonym_map()
 
-------------------------------------------------
-CASE TYPE 7: COMPLEX MULTI-CONDITION
-------------------------------------------------
-Examples:
-Q: Female consultants with influence > 4.5 in Delhi.
-SQL:
-SELECT full_name, specialty, influence_score
-FROM target_list
-WHERE gender = 'female'
-  AND influence_score > 4.5
-  AND city = 'Delhi'
-  AND designation LIKE '%Consultant%';
+# One alternation over every synonym, longest first so "doctor id" wins
+# over "id"; a single left-to-right scan per query
+_SYNONYM_PATTERN = re.compile(
+    r"\b(?:" + "|".join(
+        re.escape(word) for word in sorted(SYNONYM_MAP, key=len, reverse=True)
+    ) + r")\b"
+)
 
 
-------------------------------------------------
-CASE TYPE 8: SPECIAL RULES
-------------------------------------------------
-- Never use data not defined in schema.
-- If user asks for a non-existing column, return an SQL comment:
-  -- Error: column does not exist.
-- Always assume null-safe comparisons logically.
-- Strings must be single-quoted.
-- Date formats must be ISO: YYYY-MM-DD.
+def match_columns(query: str) -> List[Tuple[str, str]]:
+    """(table, column) pairs the query mentions, in order of first mention"""
+    matched: Dict[Tuple[str, str], None] = {}
+    for match in _SYNONYM_PATTERN.finditer(query.lower()):
+        matched.update(dict.fromkeys(SYNONYM_MAP[match.group()]))
+    return list(matched)
 
 
-================================================
-END OF SCHEMA CONTEXT
-================================================
+# table -> every column the SQL prompt describes (DDL and dictionary)
+SCHEMA_COLUMNS: Dict[str, FrozenSet[str]] = {
+    table: frozenset(_DDL_COLUMN.findall(ddl)) | SCHEMA_DICT["tables"][table]["columns"].keys()
+    for table, ddl in _TABLE_DDL.items()
+}
 
 
-"""
+@functools.lru_cache(maxsize=256)
+def get_schema_context(
+    table: Optional[str] = None, example_ids: Optional[Tuple[int, ...]] = None
+) -> str:
+    """
+    SQL prompt for one table ("target_list" or "history_table"), or for
+    both when table is None. example_ids picks the CASE_EXAMPLES to
+    include (default: every example for those tables). Each variant is
+    joined on first use.
+    """
+    tables = list(_TABLE_DDL) if table is None else [table]
+    schemas = [
+        "\n" + _format_column_dictionary(t) + "\n" + _TABLE_DDL[t] for t in tables
+    ]
+    if example_ids is None:
+        example_ids = case_example_ids(table)
+    return "\n".join([
+        _SYSTEM_OVERVIEW, _TABLES_HEADER, *schemas,
+        _CASE_TYPES_HEADER, _format_cases(example_ids), _SPECIAL_RULES
+    ])
@@ -0,0 +1,100 @@
+"""
+Semantic Cache - Embedding-keyed LRU cache
+==========================================
+Maps normalized query embeddings to cached values. A lookup returns the
+value of the most similar stored embedding when its cosine similarity is
+above the threshold.
+
+Vectors live in one preallocated float32 matrix, so a lookup is a single
+matrix-vector product. When the cache is full, the least recently used
+slot is overwritten.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """Thread-safe cosine-similarity cache with LRU eviction"""
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 10000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: Optional[np.ndarray] = None
+        self._size = 0
+        # slot -> value, ordered from least to most recently used
+        self._values: "OrderedDict[int, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, embedding) -> Optional[Any]:
+        """Return the cached value for the closest embedding, or None"""
+        vec = self._normalize(embedding)
+        with self._lock:
+            if not self._size or vec.shape[0] != self._vectors.shape[1]:
+                return None
+            scores = self._vectors[:self._size] @ vec
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                return None
+            self._values.move_to_end(slot)
+            return self._values[slot]
+
+    def add(self, embedding, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        vec = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None or vec.shape[0] != self._vectors.shape[1]:
+                self._vectors = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+                self._values.clear()
+                self._size = 0
+
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot, _ = self._values.popitem(last=False)
+
+            self._vectors[slot] = vec
+            self._values[slot] = value
+            self._values.move_to_end(slot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+            self._size = 0
+
+    def save(self, path: str) -> None:
+        """Persist vectors and JSON-serializable values to an .npz file"""
+        with self._lock:
+            if not self._size:
+                return
+            slots = list(self._values.keys())
+            with open(path, "wb") as f:
+                np.savez(
+                    f,
+                    vectors=self._vectors[slots],
+                    values=np.array(json.dumps([self._values[s] for s in slots], default=str))
+                )
+
+    def load(self, path: str) -> None:
+        """Load entries written by save(); missing files are ignored"""
+        if not os.path.exists(path):
+            return
+        data = np.load(path)
+        values = json.loads(str(data["values"]))
+        for vec, value in zip(data["vectors"], values):
+            self.add(vec, value)
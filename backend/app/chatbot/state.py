@@ -10,7 +10,16 @@ Supports 5 execution paths:
 """
 
 from typing import TypedDict, Optional, List, Dict, Any, Annotated, Tuple
-import operator
+
+
+MAX_HISTORY_TURNS = 5
+
+
+def append_bounded(
+    existing: List[Dict[str, Any]], new: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """conversation_history reducer: append the new turns, keep the last MAX_HISTORY_TURNS"""
+    return (existing + new)[-MAX_HISTORY_TURNS:]
 
 
 class AgentState(TypedDict, total=False):
@@ -67,6 +76,9 @@ class AgentState(TypedDict, total=False):
     needs_reason: bool
     """Flag: user explicitly asks for reasons"""
     
+    last_seen_version: Optional[int]
+    """Most recent version number mentioned in this conversation (maintained incrementally)"""
+    
     
     # =========================================================================
     # FILTER FIELDS (extracted by router_node)
@@ -136,7 +148,7 @@ class AgentState(TypedDict, total=False):
     # =========================================================================
     # MEMORY - Conversation History (append-only, last 5 turns)
     # =========================================================================
-    conversation_history: Annotated[List[Dict[str, Any]], operator.add]
+    conversation_history: Annotated[List[Dict[str, Any]], append_bounded]
     """
     Conversation memory tracking last 5 turns.
     
@@ -148,7 +160,8 @@ class AgentState(TypedDict, total=False):
         "timestamp": str        # ISO timestamp
     }
     
-    Annotated with operator.add for automatic list append in LangGraph.
+    Annotated with append_bounded: LangGraph appends each node's new turns
+    and drops the oldest beyond MAX_HISTORY_TURNS.
     """
     
     
@@ -199,6 +212,23 @@ class AgentState(TypedDict, total=False):
 # STATE INITIALIZATION HELPERS
 # =========================================================================
 
+# Immutable defaults copied into every new state (lists are added per call)
+_INITIAL_STATE_TEMPLATE: Dict[str, Any] = {
+    "results_count": 0,
+    "affected_rows": 0,
+    "pinecone_queries_used": 0,
+    "database_queries_used": 0,
+    "sql_executed": False,
+    "is_comparison": False,
+    "wants_explanation": False,
+    "wants_document_context": False,
+    "needs_reason": False,
+    "response_format": "natural_language",
+    "error_type": "",
+    "error_recovery": ""
+}
+
+
 def create_initial_state(user_query: str, debug: bool = False) -> AgentState:
     """
     Create initial state for a new query.
@@ -210,30 +240,18 @@ def create_initial_state(user_query: str, debug: bool = False) -> AgentState:
     Returns:
         Initialized AgentState
     """
-    return {
-        "user_query": user_query,
-        "conversation_history": [],
-        "debug_mode": debug,
-        "results": [],
-        "results_count": 0,
-        "affected_rows": 0,
-        "pinecone_queries_used": 0,
-        "database_queries_used": 0,
-        "sql_executed": False,
-        "is_comparison": False,
-        "wants_explanation": False,
-        "wants_document_context": False,
-        "needs_reason": False,
-        "response_format": "natural_language",
-        "error_type": "",
-        "error_recovery": ""
-    }
+    state = _INITIAL_STATE_TEMPLATE.copy()
+    state["user_query"] = user_query
+    state["debug_mode"] = debug
+    state["conversation_history"] = []
+    state["results"] = []
+    return state
 
 
 def merge_states(old_state: AgentState, new_state: Dict) -> AgentState:
     """
     Merge new state updates into existing state.
-    Handles list appending for conversation_history.
+    Handles (bounded) list appending for conversation_history.
     
     Args:
         old_state: Previous state
@@ -242,16 +260,15 @@ def merge_states(old_state: AgentState, new_state: Dict) -> AgentState:
     Returns:
         Merged state
     """
-    merged = dict(old_state)
+    # One C-level merge for the replaced fields
+    merged = {**old_state, **new_state}
     
-    for key, value in new_state.items():
-        if key == "conversation_history" and isinstance(value, list):
-            # For conversation history, append instead of replace
-            existing = merged.get("conversation_history", [])
-            merged["conversation_history"] = existing + value
-        else:
-            # For other fields, replace
-            merged[key] = value
+    # For conversation history, append instead of replace
+    history = new_state.get("conversation_history")
+    if isinstance(history, list):
+        merged["conversation_history"] = append_bounded(
+            old_state.get("conversation_history", []), history
+        )
     
     return merged
 
@@ -260,6 +277,13 @@ def merge_states(old_state: AgentState, new_state: Dict) -> AgentState:
 # STATE VALIDATION
 # =========================================================================
 
+_VALID_ROUTES = frozenset({
+    "database_only", "version_query", "version_hybrid",
+    "semantic_search", "invalid", ""
+})
+_VALID_RESPONSE_FORMATS = frozenset({"natural_language", "json", "error_message"})
+
+
 def validate_state(state: AgentState) -> tuple[bool, str]:
     """
     Validate that state has required fields and valid values.
@@ -271,27 +295,24 @@ def validate_state(state: AgentState) -> tuple[bool, str]:
         (is_valid: bool, error_message: str)
     """
     # Check required fields
-    if "user_query" not in state or not state["user_query"]:
+    if not state.get("user_query"):
         return False, "Missing user_query"
     
-    if "route" in state and state["route"] not in [
-        "database_only", "version_query", "version_hybrid", 
-        "semantic_search", "invalid", ""
-    ]:
-        return False, f"Invalid route: {state['route']}"
+    # One lookup per key; defaults are valid values, so missing keys pass
+    route = state.get("route", "")
+    if route not in _VALID_ROUTES:
+        return False, f"Invalid route: {route}"
     
-    if "response_format" in state and state["response_format"] not in [
-        "natural_language", "json", "error_message"
-    ]:
-        return False, f"Invalid response_format: {state['response_format']}"
+    response_format = state.get("response_format", "natural_language")
+    if response_format not in _VALID_RESPONSE_FORMATS:
+        return False, f"Invalid response_format: {response_format}"
     
-    if "results_count" in state and state["results_count"] < 0:
+    if state.get("results_count", 0) < 0:
         return False, "results_count cannot be negative"
     
-    if "routing_confidence" in state:
-        conf = state["routing_confidence"]
-        if not (0.0 <= conf <= 1.0):
-            return False, f"routing_confidence must be 0.0-1.0, got {conf}"
+    conf = state.get("routing_confidence", 0.0)
+    if not (0.0 <= conf <= 1.0):
+        return False, f"routing_confidence must be 0.0-1.0, got {conf}"
     
     return True, ""
 
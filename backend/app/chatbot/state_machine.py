@@ -27,6 +27,27 @@ from .nodes import (
 from .state import AgentState
 
 
+# route (as set by router_node) -> execution node
+_ROUTE_DISPATCH = {
+    "database_only": "DATABASE_QUERY",
+    "version_query": "VERSION_QUERY",
+    "version_hybrid": "VERSION_HYBRID",
+    "semantic_search": "SEMANTIC_SEARCH",
+    "invalid": "INVALID_HANDLER",
+}
+
+# Execution nodes, each reached from ROUTER and followed by SUMMARIZER
+_EXECUTION_NODES = tuple(dict.fromkeys(_ROUTE_DISPATCH.values()))
+_ROUTER_PATH_MAP = {node: node for node in _EXECUTION_NODES}
+
+
+def route_after_classifier(state: AgentState) -> str:
+    """
+    The ROUTER node stores a lowercase route in state["route"].
+    Based on that route, we choose which execution node runs next.
+    """
+    # Unknown routes fall back to the invalid handler (should never happen)
+    return _ROUTE_DISPATCH.get(state.get("route"), "INVALID_HANDLER")
 
 
 def build_agent_graph():
@@ -67,52 +88,14 @@ def build_agent_graph():
     # -------------------------------------------
     # CONDITIONAL ROUTING AFTER "ROUTER"
     # -------------------------------------------
-    def route_after_classifier(state: AgentState) -> str:
-        """
-        The ROUTER node stores a string in state["route"].
-        Based on that route, we choose which execution node runs next.
-        """
-
-        route = (state.get("route") or "").lower()
-
-        if route == "database_only":
-            return "DATABASE_QUERY"
-
-        elif route == "version_query":
-            return "VERSION_QUERY"
-
-        elif route == "version_hybrid":
-            return "VERSION_HYBRID"
-
-        elif route == "semantic_search":
-            return "SEMANTIC_SEARCH"
-
-        elif route == "invalid":
-            return "INVALID_HANDLER"
-
-        # Fallback (should never happen)
-        return "INVALID_HANDLER"
-
-    graph.add_conditional_edges(
-        "ROUTER",
-        route_after_classifier,
-        {
-            "DATABASE_QUERY": "DATABASE_QUERY",
-            "VERSION_QUERY": "VERSION_QUERY",
-            "VERSION_HYBRID": "VERSION_HYBRID",
-            "SEMANTIC_SEARCH": "SEMANTIC_SEARCH",
-            "INVALID_HANDLER": "INVALID_HANDLER"
-        }
-    )
-
-    
-    graph.add_edge("DATABASE_QUERY", "SUMMARIZER")
-    graph.add_edge("VERSION_QUERY", "SUMMARIZER")
-    graph.add_edge("VERSION_HYBRID", "SUMMARIZER")
-    graph.add_edge("SEMANTIC_SEARCH", "SUMMARIZER")
-    graph.add_edge("INVALID_HANDLER", "SUMMARIZER")
-
- 
+    graph.add_conditional_edges("ROUTER", route_after_classifier, _ROUTER_PATH_MAP)
+
+    # -------------------------------------------
+    # EVERY EXECUTION NODE → SUMMARIZER → END
+    # -------------------------------------------
+    for node in _EXECUTION_NODES:
+        graph.add_edge(node, "SUMMARIZER")
+
     graph.add_edge("SUMMARIZER", END)
 
     return graph.compile()
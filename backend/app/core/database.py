@@ -1,14 +1,125 @@
 
-from .config import settings
+import asyncio
+import os
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import get_settings
 try:
-    from supabase import create_client
+    from supabase import create_client, ClientOptions
 except Exception:
     create_client = None
+try:
+    from supabase import acreate_client, AsyncClientOptions
+except Exception:
+    acreate_client = None
+try:
+    import asyncpg
+except Exception:
+    asyncpg = None
 
-SUPABASE_URL = settings.SUPABASE_URL
-SUPABASE_KEY = settings.SUPABASE_KEY
+# Connection pool shared by the PostgREST/auth/storage clients of each Supabase client.
+# HTTP/2 multiplexes concurrent requests over one TLS connection.
+SUPABASE_HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", "50")),
+    max_keepalive_connections=int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20")),
+)
+# Matches supabase-py's default PostgREST timeout (the client's own is unused
+# once an httpx client is passed in)
+SUPABASE_HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "120"))
 
+@lru_cache(maxsize=1)
 def get_supabase_client():
+    """Shared Supabase client (and its HTTP connection pool), created on first use"""
     if create_client is None:
         raise RuntimeError("supabase-py not installed. Install with `pip install supabase`")
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    settings = get_settings()
+    http_client = httpx.Client(
+        limits=SUPABASE_HTTP_LIMITS, timeout=SUPABASE_HTTP_TIMEOUT, http2=True
+    )
+    return create_client(
+        settings.SUPABASE_URL, settings.SUPABASE_KEY,
+        options=ClientOptions(httpx_client=http_client)
+    )
+
+_async_client = None
+_async_client_lock = asyncio.Lock()
+
+async def get_async_supabase_client():
+    """Shared async Supabase client for async routes, created on first use"""
+    global _async_client
+    if _async_client is None:
+        if acreate_client is None:
+            raise RuntimeError("supabase-py not installed. Install with `pip install supabase`")
+        async with _async_client_lock:
+            if _async_client is None:
+                settings = get_settings()
+                http_client = httpx.AsyncClient(
+                    limits=SUPABASE_HTTP_LIMITS, timeout=SUPABASE_HTTP_TIMEOUT, http2=True
+                )
+                _async_client = await acreate_client(
+                    settings.SUPABASE_URL, settings.SUPABASE_KEY,
+                    options=AsyncClientOptions(httpx_client=http_client)
+                )
+    return _async_client
+
+# Direct Postgres pool (SUPABASE_DB_URL) for hot read paths: one wire-protocol
+# round-trip instead of HTTP -> PostgREST -> Postgres
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "5"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "20"))
+# Point SUPABASE_DB_URL at a transaction-mode pooler (PgBouncer on 6432,
+# Supavisor on 6543) so connection setup is paid once per pooled server
+# connection, not per client. Such poolers can't keep server-side prepared
+# statements, so the statement cache is off by default on those ports.
+PG_POOLER_PORTS = {6432, 6543}
+PG_STATEMENT_CACHE_SIZE = os.getenv("PG_STATEMENT_CACHE_SIZE")
+PG_APPLICATION_NAME = os.getenv("PG_APPLICATION_NAME", "crud")
+
+def _statement_cache_size(dsn: str) -> int:
+    if PG_STATEMENT_CACHE_SIZE is not None:
+        return int(PG_STATEMENT_CACHE_SIZE)
+    try:
+        port = urlsplit(dsn).port
+    except ValueError:
+        port = None
+    return 0 if port in PG_POOLER_PORTS else 1024
+
+async def _init_pg_connection(conn):
+    # Decode NUMERIC as float so rows serialize like PostgREST's JSON numbers
+    # (asyncpg's default Decimal becomes a string under response_model=Any)
+    await conn.set_type_codec(
+        "numeric", encoder=str, decoder=float, schema="pg_catalog", format="text"
+    )
+
+_pg_pool = None
+_pg_pool_lock = asyncio.Lock()
+
+async def get_pg_pool():
+    """Shared asyncpg pool, or None when asyncpg or SUPABASE_DB_URL is missing"""
+    global _pg_pool
+    if _pg_pool is None:
+        if asyncpg is None:
+            return None
+        dsn = get_settings().SUPABASE_DB_URL
+        if not dsn:
+            return None
+        async with _pg_pool_lock:
+            if _pg_pool is None:
+                _pg_pool = await asyncpg.create_pool(
+                    dsn,
+                    min_size=PG_POOL_MIN_SIZE,
+                    max_size=PG_POOL_MAX_SIZE,
+                    statement_cache_size=_statement_cache_size(dsn),
+                    server_settings={"application_name": PG_APPLICATION_NAME},
+                    init=_init_pg_connection,
+                )
+    return _pg_pool
+
+async def close_pg_pool():
+    """Close the asyncpg pool (app shutdown)"""
+    global _pg_pool
+    if _pg_pool is not None:
+        await _pg_pool.close()
+        _pg_pool = None
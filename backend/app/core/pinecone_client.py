@@ -2,12 +2,24 @@
 Pinecone client initialization and configuration
 """
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
 
 try:
     from pinecone import Pinecone
+except ImportError as e:
+    Pinecone = None
+    print(f"❌ Pinecone not installed: {e}")
+    print("   Run: pip install pinecone")
+
+
+@lru_cache(maxsize=1)
+def get_pinecone_index():
+    """Return the shared index handle, connecting on first use (errors are not cached)"""
+    if Pinecone is None:
+        raise RuntimeError("pinecone not installed. Install with `pip install pinecone`")
     
     # Get credentials from environment
     api_key = os.getenv("PINECONE_API_KEY")
@@ -17,20 +29,11 @@ try:
     if not api_key:
         raise ValueError("❌ PINECONE_API_KEY not found in environment variables")
     
-    # Initialize Pinecone
+    # Initialize Pinecone and get the index
     pc = Pinecone(api_key=api_key, environment=environment)
-    
-    # Get index
     index = pc.Index(index_name)
     
     print(f"✅ Pinecone client initialized")
     print(f"   Index: {index_name}")
     print(f"   Environment: {environment}")
-    
-except ImportError as e:
-    print(f"❌ Pinecone not installed: {e}")
-    print("   Run: pip install pinecone")
-    raise
-except Exception as e:
-    print(f"❌ Pinecone initialization error: {e}")
-    raise
\ No newline at end of file
+    return index
\ No newline at end of file
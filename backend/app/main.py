@@ -1,21 +1,37 @@
+import logging
+import os
+
+# Configure logging before the routers import the chatbot modules.
+# LOG_LEVEL=INFO shows the per-node banners, DEBUG adds SQL and LLM output.
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+    format="%(asctime)s %(levelname)s %(name)s | %(message)s",
+)
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import router as api_router
-from app.core.database import get_supabase_client
-from fastapi.responses import FileResponse
+from app.core.database import get_supabase_client, get_pg_pool, close_pg_pool
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-import os
 
-app = FastAPI(title="Supabase FastAPI API with Chatbot Integration")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(
+    title="Supabase FastAPI API with Chatbot Integration",
+    default_response_class=ORJSONResponse,
+)
 
 # === CORRECT PATHS ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))   # backend/app
 DIST_DIR = os.path.join(BASE_DIR, "dist")               # backend/app/dist
 DIST_DIR = os.path.abspath(DIST_DIR)
+INDEX_PATH = os.path.join(DIST_DIR, "index.html")
 
-print("📁 BASE_DIR =", BASE_DIR)
-print("📁 DIST_DIR =", DIST_DIR)
-print("📄 index exists? ->", os.path.exists(os.path.join(DIST_DIR, "index.html")))
+logger.info("📁 BASE_DIR = %s", BASE_DIR)
+logger.info("📁 DIST_DIR = %s", DIST_DIR)
+logger.info("📄 index exists? -> %s", os.path.exists(INDEX_PATH))
 
 # === CORS ===
 app.add_middleware(
@@ -28,32 +44,43 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Keyset paging cursor for the list endpoints (see crud._set_next_cursor)
+    expose_headers=["X-Next-Cursor"],
 )
 
 # === API ROUTES MUST COME FIRST ===
 app.include_router(api_router, prefix="/api")
 
-# === ROOT SERVE ===
-@app.get("/")
-async def root():
-    return FileResponse(os.path.join(DIST_DIR, "index.html"))
-
 # === STATIC FILES (REACT BUILD) — MUST COME AFTER API ROUTES ===
+# html=True serves index.html for "/" as well as the built assets
 app.mount("/", StaticFiles(directory=DIST_DIR, html=True), name="static")
 
 # === SPA FALLBACK (CLIENT ROUTES) ===
-@app.get("/{full_path:path}")
-async def spa_handler(full_path: str):
-    requested = os.path.join(DIST_DIR, full_path)
-    if os.path.exists(requested) and os.path.isfile(requested):
-        return FileResponse(requested)
-    return FileResponse(os.path.join(DIST_DIR, "index.html"))
+# Client-side routes are not files, so StaticFiles answers 404; serve the
+# app shell for those. API 404s keep their JSON error.
+@app.exception_handler(404)
+async def spa_fallback(request, exc):
+    if request.method == "GET" and not request.url.path.startswith("/api/"):
+        return FileResponse(INDEX_PATH)
+    return await http_exception_handler(request, exc)
 
 # === SUPABASE STARTUP ===
 @app.on_event("startup")
 def verify_supabase():
     try:
         get_supabase_client()
-        print("✅ Supabase client initialized successfully.")
+        logger.info("✅ Supabase client initialized successfully.")
+    except Exception as e:
+        logger.warning("⚠️ Failed to initialize Supabase client: %s", e)
+
+@app.on_event("startup")
+async def open_pg_pool():
+    try:
+        if await get_pg_pool() is not None:
+            logger.info("✅ Postgres connection pool ready.")
     except Exception as e:
-        print(f"⚠️ Failed to initialize Supabase client: {e}")
+        logger.warning("⚠️ Failed to create Postgres pool: %s", e)
+
+@app.on_event("shutdown")
+async def shutdown_pg_pool():
+    await close_pg_pool()
@@ -4,18 +4,56 @@ Handles SQL-based conversational queries about the pharmaceutical database
 """
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import Deque, List, Optional, Dict, Any
+from collections import OrderedDict, deque
+import functools
+import hashlib
+import logging
+import orjson
+import os
+import re
+from app.chatbot.query_cache import response_cache
+from app.chatbot.nodes import parse_version_number
 from app.chatbot.state_machine import build_agent_graph
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/chatbot", tags=["chatbot"])
 
-# Build the agent graph once at module load
-agent_graph = build_agent_graph()
 
-# Session storage for conversation history (in production, use Redis or database)
-conversation_sessions: Dict[str, List[Dict]] = {}
+@functools.lru_cache(maxsize=1)
+def get_agent_graph():
+    """Compile the agent graph on first use, then reuse it for the process"""
+    return build_agent_graph()
+
+
+# Session storage for conversation history (in production, use Redis or database).
+# Least recently used sessions are dropped past MAX_SESSIONS; each session keeps
+# its last MAX_SESSION_TURNS turns.
+MAX_SESSIONS = int(os.getenv("CHATBOT_MAX_SESSIONS", "10000"))
+MAX_SESSION_TURNS = 20
+conversation_sessions: "OrderedDict[str, Deque[Dict]]" = OrderedDict()
+
+# Preformatted context_summary lines for each session's last CONTEXT_TURNS turns,
+# appended as turns come in instead of reformatting the history per request
+CONTEXT_TURNS = 3
+session_context_lines: Dict[str, Deque[str]] = {}
+
+# Most recent version number mentioned per session (feeds router_node)
+session_last_versions: Dict[str, Optional[int]] = {}
+
+# Error answers and fallbacks are not cached so the next attempt retries
+UNCACHED_ROUTES = frozenset({"invalid", "unknown", ""})
+
+# Words that point back at earlier turns ("show their emails"); the same text
+# can mean something else once the conversation moves on
+CONTEXT_REFERENCE = re.compile(
+    r"\b(they|them|their|those|these|it|its|that|he|she|him|his|her|"
+    r"above|previous|same|such)\b"
+)
 
 
 class ChatMessage(BaseModel):
@@ -37,18 +75,130 @@ class ChatbotResponse(BaseModel):
     query_type: Optional[str] = None
 
 
-def format_conversation_context(conversation_history: list) -> str:
-    """Formats conversation history into readable context"""
-    if not conversation_history:
+def format_turn_context(turn: Dict[str, Any]) -> str:
+    """Formats one conversation turn (question and answer) for the context summary"""
+    return (
+        f"\nUser: {turn.get('query', '')[:150]}...\n"
+        f"\nAssistant: {turn.get('response', '')[:150]}...\n"
+    )
+
+
+def format_conversation_context(context_lines: Deque[str]) -> str:
+    """Formats the session's preformatted turns into readable context"""
+    if not context_lines:
         return "No previous conversation."
     
-    context = "Recent conversation:\n"
-    for msg in conversation_history[-6:]:
-        role = "User" if msg["role"] == "user" else "Assistant"
-        content = msg['content'][:150]
-        context += f"\n{role}: {content}...\n"
+    return "Recent conversation:\n" + "".join(context_lines)
+
+
+def response_cache_key(request: "ChatbotRequest", session_id: str) -> Optional[str]:
+    """Cache key: session, normalized question, request and last version seen.
+    None for follow-ups that lean on earlier turns, so they are never cached."""
+    question = " ".join(request.question.lower().split())
+    if CONTEXT_REFERENCE.search(question):
+        return None
+    raw = f"{session_id}|{question}|{request.request_id}|{session_last_versions.get(session_id)}"
+    return hashlib.blake2b(raw.encode()).hexdigest()
+
+
+def get_session_history(session_id: str) -> Deque[Dict]:
+    """Return the session's history, creating it and marking it most recently used"""
+    history = conversation_sessions.get(session_id)
+    if history is None:
+        history = conversation_sessions[session_id] = deque(maxlen=MAX_SESSION_TURNS)
+        session_context_lines[session_id] = deque(maxlen=CONTEXT_TURNS)
+        while len(conversation_sessions) > MAX_SESSIONS:
+            evicted, _ = conversation_sessions.popitem(last=False)
+            session_context_lines.pop(evicted, None)
+            session_last_versions.pop(evicted, None)
+    else:
+        conversation_sessions.move_to_end(session_id)
+    return history
+
+
+# Immutable defaults copied into every request's graph input (lists are added per call)
+_SESSION_CONTEXT_TEMPLATE: Dict[str, Any] = {
+    "current_table": None,
+    "last_query_type": None,
+    "last_results_summary": "",
+    "last_sql_query": None,
+    "last_result_count": 0
+}
+_INITIAL_STATE_TEMPLATE: Dict[str, Any] = {
+    "needs_sql": False,
+    "is_clarification": False
+}
+
+
+def build_initial_state(request: ChatbotRequest, session_id: str) -> Dict[str, Any]:
+    """Build the graph input for a request, seeded with the session's history"""
+    session_context = _SESSION_CONTEXT_TEMPLATE.copy()
+    session_context["active_request_id"] = request.request_id
+    session_context["mentioned_tables"] = []
+    
+    # 🔥 FIX: Build initial state with existing history
+    state = _INITIAL_STATE_TEMPLATE.copy()
+    state["user_query"] = request.question
+    # The graph slices and concatenates conversation_history, so it gets a list
+    state["conversation_history"] = list(get_session_history(session_id))  # ✅ Pass existing history
+    state["last_seen_version"] = session_last_versions.get(session_id)
+    state["context_summary"] = format_conversation_context(session_context_lines[session_id])
+    state["session_context"] = session_context
+    state["request_id"] = request.request_id
+    return state
+
+
+def record_turn(session_id: str, turn: Dict[str, Any], last_version: Optional[int]) -> None:
+    """Append a turn to the session's history and its context_summary lines"""
+    get_session_history(session_id).append(turn)
+    session_context_lines[session_id].append(format_turn_context(turn))
+    session_last_versions[session_id] = last_version
+
+
+def finish_session_turn(session_id: str, final_state: Dict[str, Any], cache_key: Optional[str]) -> ChatbotResponse:
+    """Store the updated history for the session and build the API response"""
+    response_text = final_state.get("response", "Sorry, I couldn't generate a response.")
+    
+    # 🔥 FIX: Use the UPDATED conversation_history from final_state
+    # (summarizer_node / handle_invalid_route already appended the new turn)
+    updated_history = final_state.get("conversation_history", [])
+    
+    # Store the new turn back to the session; the deque drops the oldest turn
+    history = get_session_history(session_id)
+    if updated_history and (not history or updated_history[-1] is not history[-1]):
+        record_turn(session_id, updated_history[-1], final_state.get("last_seen_version"))
+    
+    # Fields come from our own graph state, so skip pydantic validation
+    response = ChatbotResponse.model_construct(
+        answer=response_text,
+        generated_sql=final_state.get("generated_sql"),
+        row_count=final_state.get("results_count", 0),
+        query_type=final_state.get("route")
+    )
     
-    return context
+    if (
+        cache_key is not None
+        and final_state.get("route", "") not in UNCACHED_ROUTES
+        and not final_state.get("error")
+    ):
+        response_cache.put(cache_key, response)
+    
+    return response
+
+
+def record_cached_turn(request: ChatbotRequest, session_id: str, cached: ChatbotResponse) -> None:
+    """Record a cache hit as a turn, so follow-ups see it like any other answer"""
+    turn = {
+        "query": request.question,
+        "response": cached.answer,
+        "route": cached.query_type or "unknown",
+        "timestamp": datetime.now().isoformat()
+    }
+    record_turn(
+        session_id,
+        turn,
+        parse_version_number(request.question) or session_last_versions.get(session_id),
+    )
 
 
 @router.post("/query", response_model=ChatbotResponse)
@@ -59,61 +209,69 @@ async def chat_query(request: ChatbotRequest):
     try:
         # Get or create session
         session_id = request.session_id or "default"
-        if session_id not in conversation_sessions:
-            conversation_sessions[session_id] = []
+        cache_key = response_cache_key(request, session_id)
+        cached = response_cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            record_cached_turn(request, session_id, cached)
+            return cached
         
-        conversation_history = conversation_sessions[session_id]
-        
-        # 🔥 FIX: Build initial state with existing history
-        initial_state = {
-            "user_query": request.question,
-            "conversation_history": conversation_history,  # ✅ Pass existing history
-            "context_summary": format_conversation_context(conversation_history),
-            "session_context": {
-                "current_table": None,
-                "last_query_type": None,
-                "active_request_id": request.request_id,
-                "last_results_summary": "",
-                "mentioned_tables": [],
-                "last_sql_query": None,
-                "last_result_count": 0
-            },
-            "request_id": request.request_id,
-            "needs_sql": False,
-            "is_clarification": False
-        }
+        initial_state = build_initial_state(request, session_id)
         
         # Invoke the agent graph
-        final_state = agent_graph.invoke(initial_state)
-        
-        response_text = final_state.get("response", "Sorry, I couldn't generate a response.")
-        
-        # 🔥 FIX: Use the UPDATED conversation_history from final_state
-        # (save_to_memory() already appended the new turn)
-        updated_history = final_state.get("conversation_history", [])
+        final_state = await get_agent_graph().ainvoke(initial_state)
         
-        # Store the updated history back to session
-        conversation_sessions[session_id] = updated_history[-20:]  # Keep last 20 turns
-        
-        # Return response
-        return ChatbotResponse(
-            answer=response_text,
-            generated_sql=final_state.get("generated_sql"),
-            row_count=final_state.get("results_count", 0),
-            query_type=final_state.get("route")
-        )
+        return finish_session_turn(session_id, final_state, cache_key)
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("chat_query failed")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
 
+@router.post("/query/stream")
+async def chat_query_stream(request: ChatbotRequest):
+    """
+    Same as /query, but streams the LLM summary while it is generated.
+    Response is newline-delimited JSON:
+      {"type": "token", "text": "..."}   (zero or more)
+      {"type": "final", ...ChatbotResponse fields}
+      {"type": "error", "detail": "..."} (instead of final on failure)
+    """
+    session_id = request.session_id or "default"
+    cache_key = response_cache_key(request, session_id)
+    cached = response_cache.get(cache_key) if cache_key is not None else None
+    initial_state = build_initial_state(request, session_id)
+    if cached is not None:
+        record_cached_turn(request, session_id, cached)
+    
+    async def events():
+        if cached is not None:
+            yield orjson.dumps({"type": "final", **cached.model_dump()}) + b"\n"
+            return
+        try:
+            final_state = initial_state
+            async for mode, chunk in get_agent_graph().astream(
+                initial_state, stream_mode=["custom", "values"]
+            ):
+                if mode == "custom" and "summary_token" in chunk:
+                    yield orjson.dumps({"type": "token", "text": chunk["summary_token"]}) + b"\n"
+                elif mode == "values":
+                    final_state = chunk
+            
+            response = finish_session_turn(session_id, final_state, cache_key)
+            yield orjson.dumps({"type": "final", **response.model_dump()}) + b"\n"
+        except Exception as e:
+            logger.exception("chat_query_stream failed")
+            yield orjson.dumps({"type": "error", "detail": f"Error processing query: {str(e)}"}) + b"\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @router.post("/clear-session")
 async def clear_session(session_id: str = "default"):
     """Clear conversation history for a session"""
-    if session_id in conversation_sessions:
-        del conversation_sessions[session_id]
+    conversation_sessions.pop(session_id, None)
+    session_context_lines.pop(session_id, None)
+    session_last_versions.pop(session_id, None)
     return {"message": f"Session {session_id} cleared"}
 
 
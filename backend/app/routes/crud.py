@@ -1,78 +1,52 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, Response, status
 from fastapi.responses import JSONResponse
-from app.core.database import get_supabase_client
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from app.core.database import get_async_supabase_client, get_pg_pool
+from app.chatbot.query_cache import QueryCache, response_cache
+from typing import List, Dict, Any, Optional, Union
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
 
 supabase = None
-def _get_supabase():
+async def _get_supabase():
     global supabase
     if supabase is None:
-        supabase = get_supabase_client()
+        supabase = await get_async_supabase_client()
     return supabase
 
-# ✅ Count total rows in any table
-def count_total_rows(sb, table_name: str) -> int:
-    """Return total number of rows for a given table."""
-    try:
-        resp = sb.table(table_name).select("*", count="exact").execute()
-        return resp.count or 0
-    except Exception as e:
-        print(f"❌ Error counting rows in {table_name}: {e}")
-        return 0
-
-
-# ✅ Count total change entries for a table (based on list_versions or global_version_control)
-def count_total_changes(sb, table_name: str) -> int:
-    """Return number of version changes logged for a given table."""
-    try:
-        resp = (
-            sb.table("global_version_control")
-            .select("id", count="exact")
-            .eq("table_name", table_name)
-            .execute()
-        )
-        return resp.count or 0
-    except Exception as e:
-        print(f"❌ Error counting version changes for {table_name}: {e}")
-        return 0
-
-
-def update_global_version(sb, table_name: str, change_type: str, changed_by: str = "system"):
-    """
-    Insert entry in global_version_control dynamically when data changes.
-    Keeps total rows and total changes up to date.
-    """
-    try:
-        total_rows = count_total_rows(sb, table_name)
-        total_changes = count_total_changes(sb, table_name) + 1
-        version_number = total_changes
-
-        record = {
-            "table_name": table_name,
-            "version_number": version_number,
-            "change_type": change_type,
-            "changed_rows": 1,
-            "total_rows": total_rows,
-            "change_summary": f"{change_type} operation on {table_name}",
-            "triggered_by": changed_by,
-            "timestamp": datetime.utcnow().isoformat(),
-        }
+async def _pg_fetch(sql: str, *args) -> Optional[List[Dict[str, Any]]]:
+    """Run a read on the asyncpg pool; None when only PostgREST is configured"""
+    pool = await get_pg_pool()
+    if pool is None:
+        return None
+    async with pool.acquire() as conn:
+        return [dict(r) for r in await conn.fetch(sql, *args)]
 
-        sb.table("global_version_control").insert(record).execute()
-        print(f"✅ Global version updated for {table_name} → {change_type}")
-    except Exception as e:
-        print(f"❌ Error updating global_version_control for {table_name}: {e}")
+# Default version ID, looked up once and reused by every create endpoint.
+# Reset whenever list_versions is written through this API.
+_default_version_id: Optional[int] = None
 
+def _reset_default_version_cache():
+    global _default_version_id
+    _default_version_id = None
 
-def _get_or_create_default_version(sb) -> int:
+async def _get_or_create_default_version(sb) -> int:
     """Get or create a default version ID for standalone entries."""
+    global _default_version_id
+    if _default_version_id is not None:
+        return _default_version_id
+    _default_version_id = await _lookup_or_create_default_version(sb)
+    return _default_version_id
+
+async def _lookup_or_create_default_version(sb) -> int:
     try:
-        resp = sb.table('list_versions').select('version_id').eq('version_number', 0).limit(1).execute()
+        resp = await sb.table('list_versions').select('version_id').eq('version_number', 0).limit(1).execute()
         if resp.data and len(resp.data) > 0:
             return resp.data[0]['version_id']
         
-        resp = sb.table('list_versions').select('version_id').limit(1).execute()
+        resp = await sb.table('list_versions').select('version_id').limit(1).execute()
         if resp.data and len(resp.data) > 0:
             return resp.data[0]['version_id']
         
@@ -83,665 +57,205 @@ def _get_or_create_default_version(sb) -> int:
             "created_by": "system",
             "is_current": True
         }
-        resp = sb.table('list_versions').insert(default_version).execute()
+        resp = await sb.table('list_versions').insert(default_version).execute()
         if resp.data and len(resp.data) > 0:
             return resp.data[0]['version_id']
         
         return None
-    except Exception as e:
-        print(f"Error getting or creating default version: {e}")
+    except Exception:
+        logger.exception("Error getting or creating default version")
         return None
 
-def record_version_change(sb, table_name: str, change_type: str, triggered_by: str = "system", change_summary: str = "", request_id: int = None):
-    """
-    Record a version entry in both list_versions and global_version_control
-    whenever an insert/update/delete occurs.
-    """
-    try:
-        resp = sb.table('global_version_control').select('version_number').eq('table_name', table_name).order('version_number', desc=True).limit(1).execute()
-        last_version = resp.data[0]['version_number'] if resp.data else 0
-        new_version = last_version + 1
-
-        if request_id:
-            version_payload = {
-                "request_id": request_id,
-                "version_number": new_version,
-                "change_type": change_type,
-                "change_rationale": change_summary or f"{change_type} operation on {table_name}",
-                "created_by": triggered_by,
-                "is_current": True
-            }
-            sb.table('list_versions').insert(version_payload).execute()
-
-        global_payload = {
-            "table_name": table_name,
-            "version_number": new_version,
-            "change_type": change_type,
-            "changed_rows": 1,
-            "change_summary": change_summary or f"{change_type} operation in {table_name}",
-            "triggered_by": triggered_by
-        }
-        sb.table('global_version_control').insert(global_payload).execute()
-
-    except Exception as e:
-        print(f"[VersionControlError] Failed to record version change: {e}")
-
-
-def _prepare_entry_data(item: Dict[str, Any], sb=None) -> Dict[str, Any]:
+async def _prepare_entry_data(item: Dict[str, Any], sb=None) -> Dict[str, Any]:
     """Prepare entry data for insertion by setting defaults for required fields."""
-    if 'version_id' not in item or item['version_id'] == '' or item['version_id'] is None:
-        if sb:
-            default_version_id = _get_or_create_default_version(sb)
-            if default_version_id:
-                item['version_id'] = default_version_id
-            else:
-                item.pop('version_id', None)
-        else:
-            item.pop('version_id', None)
+    # Fast path: the caller supplied a version_id
+    if item.get('version_id') not in (None, ''):
+        return item
+    if sb:
+        default_version_id = await _get_or_create_default_version(sb)
+        if default_version_id:
+            item['version_id'] = default_version_id
+            return item
+    item.pop('version_id', None)
     return item
 
 routers = []
 
-call_list_entries_router = APIRouter(prefix='/call_list_entries', tags=['call_list_entries'])
-@call_list_entries_router.get('/', response_model=List[Dict[str, Any]])
-def list_call_list_entries(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('call_list_entries').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+# List results for read-mostly tables, per table and cleared by that table's
+# write endpoints. The TTL bounds staleness from writes made elsewhere
+# (lists/injection routes, triggers); 0 disables the cache.
+LIST_CACHE_TTL = float(os.getenv("CRUD_LIST_CACHE_TTL", "30"))
+_list_caches: Dict[str, QueryCache] = {}
 
-@call_list_entries_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_call_list_entries(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        item = _prepare_entry_data(item, sb)
-        resp = sb.table('call_list_entries').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+# Upper bound on ?limit= for list endpoints; larger reads page with ?cursor=
+MAX_LIST_LIMIT = 1000
 
-@call_list_entries_router.get('/{item_id}')
-def get_call_list_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('call_list_entries').select('*').eq('entry_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
-@call_list_entries_router.put('/{item_id}')
-def update_call_list_entries(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('call_list_entries').update(item).eq('entry_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def _page(query, pk: str, limit: int, cursor: Optional[int] = None):
+    """Keyset pagination: the next `limit` rows after `cursor` in primary-key order"""
+    if cursor is not None:
+        query = query.gt(pk, cursor)
+    return query.order(pk).limit(limit)
 
-@call_list_entries_router.delete('/{item_id}')
-def delete_call_list_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('call_list_entries').delete().eq('entry_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(call_list_entries_router)
-
-competitor_target_entries_router = APIRouter(prefix='/competitor_target_entries', tags=['competitor_target_entries'])
-@competitor_target_entries_router.get('/', response_model=List[Dict[str, Any]])
-def list_competitor_target_entries(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('competitor_target_entries').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@competitor_target_entries_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_competitor_target_entries(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        item = _prepare_entry_data(item, sb)
-        resp = sb.table('competitor_target_entries').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@competitor_target_entries_router.get('/{item_id}')
-def get_competitor_target_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('competitor_target_entries').select('*').eq('entry_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@competitor_target_entries_router.put('/{item_id}')
-def update_competitor_target_entries(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('competitor_target_entries').update(item).eq('entry_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@competitor_target_entries_router.delete('/{item_id}')
-def delete_competitor_target_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('competitor_target_entries').delete().eq('entry_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(competitor_target_entries_router)
 
-digital_engagement_entries_router = APIRouter(prefix='/digital_engagement_entries', tags=['digital_engagement_entries'])
-@digital_engagement_entries_router.get('/', response_model=List[Dict[str, Any]])
-def list_digital_engagement_entries(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('digital_engagement_entries').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@digital_engagement_entries_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_digital_engagement_entries(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        item = _prepare_entry_data(item, sb)
-        resp = sb.table('digital_engagement_entries').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def _set_next_cursor(response: Response, rows: List[Dict[str, Any]], pk: str, limit: int) -> None:
+    """A full page may have more rows after it; hand the client the key to resume from"""
+    if rows and len(rows) == limit:
+        response.headers['X-Next-Cursor'] = str(rows[-1][pk])
 
-@digital_engagement_entries_router.get('/{item_id}')
-def get_digital_engagement_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('digital_engagement_entries').select('*').eq('entry_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
-@digital_engagement_entries_router.put('/{item_id}')
-def update_digital_engagement_entries(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('digital_engagement_entries').update(item).eq('entry_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@digital_engagement_entries_router.delete('/{item_id}')
-def delete_digital_engagement_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('digital_engagement_entries').delete().eq('entry_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(digital_engagement_entries_router)
-
-domains_router = APIRouter(prefix='/domains', tags=['domains'])
-@domains_router.get('/', response_model=List[Dict[str, Any]])
-def list_domains(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('domains').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@domains_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_domains(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('domains').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@domains_router.get('/{item_id}')
-def get_domains(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('domains').select('*').eq('domain_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@domains_router.put('/{item_id}')
-def update_domains(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('domains').update(item).eq('domain_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@domains_router.delete('/{item_id}')
-def delete_domains(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('domains').delete().eq('domain_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(domains_router)
-
-event_invitation_entries_router = APIRouter(prefix='/event_invitation_entries', tags=['event_invitation_entries'])
-@event_invitation_entries_router.get('/', response_model=List[Dict[str, Any]])
-def list_event_invitation_entries(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('event_invitation_entries').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@event_invitation_entries_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_event_invitation_entries(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        item = _prepare_entry_data(item, sb)
-        resp = sb.table('event_invitation_entries').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@event_invitation_entries_router.get('/{item_id}')
-def get_event_invitation_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('event_invitation_entries').select('*').eq('entry_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@event_invitation_entries_router.put('/{item_id}')
-def update_event_invitation_entries(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('event_invitation_entries').update(item).eq('entry_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@event_invitation_entries_router.delete('/{item_id}')
-def delete_event_invitation_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('event_invitation_entries').delete().eq('entry_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(event_invitation_entries_router)
-
-formulary_decision_maker_entries_router = APIRouter(prefix='/formulary_decision_maker_entries', tags=['formulary_decision_maker_entries'])
-@formulary_decision_maker_entries_router.get('/', response_model=List[Dict[str, Any]])
-def list_formulary_decision_maker_entries(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('formulary_decision_maker_entries').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@formulary_decision_maker_entries_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_formulary_decision_maker_entries(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        item = _prepare_entry_data(item, sb)
-        resp = sb.table('formulary_decision_maker_entries').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@formulary_decision_maker_entries_router.get('/{item_id}')
-def get_formulary_decision_maker_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('formulary_decision_maker_entries').select('*').eq('entry_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@formulary_decision_maker_entries_router.put('/{item_id}')
-def update_formulary_decision_maker_entries(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('formulary_decision_maker_entries').update(item).eq('entry_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@formulary_decision_maker_entries_router.delete('/{item_id}')
-def delete_formulary_decision_maker_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('formulary_decision_maker_entries').delete().eq('entry_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(formulary_decision_maker_entries_router)
-
-high_value_prescriber_entries_router = APIRouter(prefix='/high_value_prescriber_entries', tags=['high_value_prescriber_entries'])
-@high_value_prescriber_entries_router.get('/', response_model=List[Dict[str, Any]])
-def list_high_value_prescriber_entries(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('high_value_prescriber_entries').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@high_value_prescriber_entries_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_high_value_prescriber_entries(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        item = _prepare_entry_data(item, sb)
-        resp = sb.table('high_value_prescriber_entries').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@high_value_prescriber_entries_router.get('/{item_id}')
-def get_high_value_prescriber_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('high_value_prescriber_entries').select('*').eq('entry_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@high_value_prescriber_entries_router.put('/{item_id}')
-def update_high_value_prescriber_entries(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('high_value_prescriber_entries').update(item).eq('entry_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@high_value_prescriber_entries_router.delete('/{item_id}')
-def delete_high_value_prescriber_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('high_value_prescriber_entries').delete().eq('entry_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(high_value_prescriber_entries_router)
-
-idn_health_system_entries_router = APIRouter(prefix='/idn_health_system_entries', tags=['idn_health_system_entries'])
-@idn_health_system_entries_router.get('/', response_model=List[Dict[str, Any]])
-def list_idn_health_system_entries(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('idn_health_system_entries').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@idn_health_system_entries_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_idn_health_system_entries(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        item = _prepare_entry_data(item, sb)
-        resp = sb.table('idn_health_system_entries').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@idn_health_system_entries_router.get('/{item_id}')
-def get_idn_health_system_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('idn_health_system_entries').select('*').eq('entry_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@idn_health_system_entries_router.put('/{item_id}')
-def update_idn_health_system_entries(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('idn_health_system_entries').update(item).eq('entry_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@idn_health_system_entries_router.delete('/{item_id}')
-def delete_idn_health_system_entries(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('idn_health_system_entries').delete().eq('entry_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(idn_health_system_entries_router)
-
-list_requests_router = APIRouter(prefix='/list_requests', tags=['list_requests'])
+def make_crud_router(table: str, pk: str, prepare_entry: bool = False, on_write=None,
+                     with_list: bool = True, cache_list: bool = False) -> APIRouter:
+    """
+    Build the standard list/create/get/update/delete router for a table.
+    prepare_entry fills default fields via _prepare_entry_data before inserts;
+    on_write runs after every successful write; with_list=False leaves the
+    list endpoint to the caller (for tables with extra filters); cache_list
+    serves list results from _list_caches[table] for LIST_CACHE_TTL seconds.
+    """
+    router = APIRouter(prefix=f'/{table}', tags=[table])
+    cache = None
+    if cache_list and LIST_CACHE_TTL > 0:
+        cache = _list_caches[table] = QueryCache(max_entries=256, ttl_seconds=LIST_CACHE_TTL)
+
+    def after_write():
+        response_cache.invalidate()
+        if cache is not None:
+            cache.invalidate()
+        if on_write:
+            on_write()
+
+    if with_list:
+        @router.get('/', response_model=List[Dict[str, Any]], name=f'list_{table}')
+        async def list_items(response: Response, limit: int = Query(100, ge=1, le=MAX_LIST_LIMIT),
+                             cursor: Optional[int] = None):
+            rows = cache.get((limit, cursor)) if cache is not None else None
+            if rows is None:
+                sb = await _get_supabase()
+                try:
+                    resp = await _page(sb.table(table).select('*'), pk, limit, cursor).execute()
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=str(e))
+                rows = resp.data
+                if cache is not None:
+                    cache.put((limit, cursor), rows)
+            _set_next_cursor(response, rows, pk, limit)
+            return rows
+
+    @router.post('/', status_code=status.HTTP_201_CREATED, name=f'create_{table}')
+    async def create_item(item: Union[Dict[str, Any], List[Dict[str, Any]]]):
+        """Create one row, or several in a single multi-row insert when given a list"""
+        sb = await _get_supabase()
+        try:
+            if isinstance(item, list):
+                if not item:
+                    raise HTTPException(status_code=400, detail='No items provided')
+                if prepare_entry:
+                    # The default version is resolved once and reused for every row
+                    item = [await _prepare_entry_data(row, sb) for row in item]
+            elif prepare_entry:
+                item = await _prepare_entry_data(item, sb)
+            resp = await sb.table(table).insert(item).execute()
+            after_write()
+            return resp.data
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.get('/{item_id}', name=f'get_{table}')
+    async def get_item(item_id: int):
+        sb = await _get_supabase()
+        try:
+            # maybe_single() asks PostgREST for a bare object instead of an array;
+            # depending on the postgrest-py version a miss gives None or data=None
+            resp = await sb.table(table).select('*').eq(pk, item_id).maybe_single().execute()
+            if resp is None or resp.data is None:
+                raise HTTPException(status_code=404, detail='Not found')
+            return resp.data
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.put('/{item_id}', name=f'update_{table}')
+    async def update_item(item_id: int, item: Dict[str, Any]):
+        sb = await _get_supabase()
+        try:
+            resp = await sb.table(table).update(item).eq(pk, item_id).execute()
+            after_write()
+            return resp.data
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.delete('/{item_id}', name=f'delete_{table}')
+    async def delete_item(item_id: int):
+        sb = await _get_supabase()
+        try:
+            await sb.table(table).delete().eq(pk, item_id).execute()
+            after_write()
+            return JSONResponse(status_code=200, content={'deleted': True})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return router
+
+
+routers.append(make_crud_router('call_list_entries', 'entry_id', prepare_entry=True))
+routers.append(make_crud_router('competitor_target_entries', 'entry_id', prepare_entry=True))
+routers.append(make_crud_router('digital_engagement_entries', 'entry_id', prepare_entry=True))
+routers.append(make_crud_router('domains', 'domain_id', cache_list=True))
+routers.append(make_crud_router('event_invitation_entries', 'entry_id', prepare_entry=True))
+routers.append(make_crud_router('formulary_decision_maker_entries', 'entry_id', prepare_entry=True))
+routers.append(make_crud_router('high_value_prescriber_entries', 'entry_id', prepare_entry=True))
+routers.append(make_crud_router('idn_health_system_entries', 'entry_id', prepare_entry=True))
+
+list_requests_router = make_crud_router('list_requests', 'request_id', with_list=False)
 @list_requests_router.get('/', response_model=List[Dict[str, Any]])
-def list_list_requests(limit: int = 100, subdomain_id: Optional[int] = None, domain_id: Optional[int] = None):
-    sb = _get_supabase()
+async def list_list_requests(response: Response, limit: int = Query(100, ge=1, le=MAX_LIST_LIMIT),
+                             cursor: Optional[int] = None,
+                             subdomain_id: Optional[int] = None, domain_id: Optional[int] = None):
+    sb = await _get_supabase()
     try:
         if domain_id is not None:
-            query = sb.table('list_requests').select(', subdomains()')
-            resp = query.limit(limit).execute()
-            data = resp.data if hasattr(resp, 'data') else resp
-            filtered_data = [item for item in data if item.get('subdomains') and item['subdomains'].get('domain_id') == domain_id]
-            return filtered_data
+            # !inner makes the embed an INNER JOIN, so the domain filter runs in Postgres
+            query = sb.table('list_requests').select('*, subdomains!inner(*)')
+            query = query.eq('subdomains.domain_id', domain_id)
         else:
             query = sb.table('list_requests').select('*')
             if subdomain_id is not None:
                 query = query.eq('subdomain_id', subdomain_id)
-            resp = query.limit(limit).execute()
-            return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@list_requests_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_list_requests(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('list_requests').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@list_requests_router.get('/{item_id}')
-def get_list_requests(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('list_requests').select('*').eq('request_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@list_requests_router.put('/{item_id}')
-def update_list_requests(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('list_requests').update(item).eq('request_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@list_requests_router.delete('/{item_id}')
-def delete_list_requests(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('list_requests').delete().eq('request_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
+        resp = await _page(query, 'request_id', limit, cursor).execute()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    _set_next_cursor(response, resp.data, 'request_id', limit)
+    return resp.data
 
 routers.append(list_requests_router)
 
-list_versions_router = APIRouter(prefix='/list_versions', tags=['list_versions'])
-@list_versions_router.get('/', response_model=List[Dict[str, Any]])
-def list_list_versions(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('list_versions').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@list_versions_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_list_versions(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('list_versions').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@list_versions_router.get('/{item_id}')
-def get_list_versions(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('list_versions').select('*').eq('version_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@list_versions_router.put('/{item_id}')
-def update_list_versions(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('list_versions').update(item).eq('version_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@list_versions_router.delete('/{item_id}')
-def delete_list_versions(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('list_versions').delete().eq('version_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(list_versions_router)
+routers.append(make_crud_router('list_versions', 'version_id', on_write=_reset_default_version_cache, cache_list=True))
 
-subdomains_router = APIRouter(prefix='/subdomains', tags=['subdomains'])
+subdomains_router = make_crud_router('subdomains', 'subdomain_id', with_list=False, cache_list=True)
 @subdomains_router.get('/', response_model=List[Dict[str, Any]])
-def list_subdomains(limit: int = 100, domain_id: Optional[int] = None):
-    sb = _get_supabase()
-    try:
-        query = sb.table('subdomains').select('*')
-        if domain_id is not None:
-            query = query.eq('domain_id', domain_id)
-        resp = query.limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@subdomains_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_subdomains(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('subdomains').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@subdomains_router.get('/{item_id}')
-def get_subdomains(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('subdomains').select('*').eq('subdomain_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@subdomains_router.put('/{item_id}')
-def update_subdomains(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('subdomains').update(item).eq('subdomain_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@subdomains_router.delete('/{item_id}')
-def delete_subdomains(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('subdomains').delete().eq('subdomain_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def list_subdomains(response: Response, limit: int = Query(100, ge=1, le=MAX_LIST_LIMIT),
+                          cursor: Optional[int] = None, domain_id: Optional[int] = None):
+    cache = _list_caches.get('subdomains')
+    key = (limit, cursor, domain_id)
+    rows = cache.get(key) if cache is not None else None
+    if rows is None:
+        sb = await _get_supabase()
+        try:
+            query = sb.table('subdomains').select('*')
+            if domain_id is not None:
+                query = query.eq('domain_id', domain_id)
+            resp = await _page(query, 'subdomain_id', limit, cursor).execute()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        rows = resp.data
+        if cache is not None:
+            cache.put(key, rows)
+    _set_next_cursor(response, rows, 'subdomain_id', limit)
+    return rows
 
 routers.append(subdomains_router)
 
@@ -755,24 +269,31 @@ routers.append(subdomains_router)
 target_list_router = APIRouter(prefix='/target_list', tags=['target_list'])
 
 @target_list_router.get('/', response_model=List[Dict[str, Any]])
-def list_target_list(limit: int = 100):
-    """Get all target list entries"""
-    sb = _get_supabase()
+async def list_target_list(response: Response, limit: int = Query(100, ge=1, le=MAX_LIST_LIMIT),
+                           cursor: Optional[int] = None):
+    """Get target list entries, one page at a time"""
     try:
-        resp = sb.table('target_list').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
+        rows = await _pg_fetch(
+            'SELECT * FROM target_list WHERE $1::bigint IS NULL OR id > $1 ORDER BY id LIMIT $2',
+            cursor, limit
+        )
+        if rows is None:
+            sb = await _get_supabase()
+            rows = (await _page(sb.table('target_list').select('*'), 'id', limit, cursor).execute()).data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    _set_next_cursor(response, rows, 'id', limit)
+    return rows
 
 
 @target_list_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_target_list_entry(item: Dict[str, Any]):
+async def create_target_list_entry(item: Dict[str, Any]):
     """
     Create a new target list entry
     Required fields: full_name
     Database triggers automatically log to history_table
     """
-    sb = _get_supabase()
+    sb = await _get_supabase()
     try:
         if 'full_name' not in item or not item['full_name']:
             raise HTTPException(status_code=400, detail='full_name is required')
@@ -786,10 +307,11 @@ def create_target_list_entry(item: Dict[str, Any]):
         }
         
         cleaned_item = {k: v for k, v in item.items() if k in valid_columns}
-        resp = sb.table('target_list').insert(cleaned_item).execute()
+        resp = await sb.table('target_list').insert(cleaned_item).execute()
+        response_cache.invalidate()
         
         if resp.data and len(resp.data) > 0:
-            print(f"✅ Created target list entry: {resp.data[0].get('id')}")
+            logger.debug("Created target list entry: %s", resp.data[0].get('id'))
             return resp.data[0]
         
         raise HTTPException(status_code=500, detail='Failed to create entry')
@@ -797,17 +319,18 @@ def create_target_list_entry(item: Dict[str, Any]):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error creating target list entry: {e}")
+        logger.exception("Error creating target list entry")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @target_list_router.get('/{item_id}')
-def get_target_list_entry(item_id: int):
+async def get_target_list_entry(item_id: int):
     """Get a specific target list entry by ID"""
-    sb = _get_supabase()
     try:
-        resp = sb.table('target_list').select('*').eq('id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
+        data = await _pg_fetch('SELECT * FROM target_list WHERE id = $1', item_id)
+        if data is None:
+            sb = await _get_supabase()
+            data = (await sb.table('target_list').select('*').eq('id', item_id).execute()).data
         
         if not data or len(data) == 0:
             raise HTTPException(status_code=404, detail='Target list entry not found')
@@ -820,9 +343,9 @@ def get_target_list_entry(item_id: int):
 
 
 @target_list_router.put('/{item_id}')
-def update_target_list_entry(item_id: int, item: Dict[str, Any]):
+async def update_target_list_entry(item_id: int, item: Dict[str, Any]):
     """Update a target list entry"""
-    sb = _get_supabase()
+    sb = await _get_supabase()
     try:
         valid_columns = {
             'hcp_code', 'full_name', 'gender', 'qualification', 'specialty',
@@ -837,14 +360,15 @@ def update_target_list_entry(item_id: int, item: Dict[str, Any]):
         if not cleaned_item:
             raise HTTPException(status_code=400, detail='No valid fields to update')
         
-        check_resp = sb.table('target_list').select('id').eq('id', item_id).execute()
+        check_resp = await sb.table('target_list').select('id').eq('id', item_id).execute()
         if not check_resp.data:
             raise HTTPException(status_code=404, detail='Target list entry not found')
         
-        resp = sb.table('target_list').update(cleaned_item).eq('id', item_id).execute()
+        resp = await sb.table('target_list').update(cleaned_item).eq('id', item_id).execute()
+        response_cache.invalidate()
         
         if resp.data and len(resp.data) > 0:
-            print(f"✅ Updated target list entry: {item_id}")
+            logger.debug("Updated target list entry: %s", item_id)
             return resp.data[0]
         
         raise HTTPException(status_code=500, detail='Failed to update entry')
@@ -852,22 +376,23 @@ def update_target_list_entry(item_id: int, item: Dict[str, Any]):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error updating target list entry: {e}")
+        logger.exception("Error updating target list entry %s", item_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @target_list_router.delete('/{item_id}')
-def delete_target_list_entry(item_id: int):
+async def delete_target_list_entry(item_id: int):
     """Delete a target list entry"""
-    sb = _get_supabase()
+    sb = await _get_supabase()
     try:
-        check_resp = sb.table('target_list').select('id').eq('id', item_id).execute()
+        check_resp = await sb.table('target_list').select('id').eq('id', item_id).execute()
         if not check_resp.data:
             raise HTTPException(status_code=404, detail='Target list entry not found')
         
-        resp = sb.table('target_list').delete().eq('id', item_id).execute()
+        resp = await sb.table('target_list').delete().eq('id', item_id).execute()
+        response_cache.invalidate()
         
-        print(f"✅ Deleted target list entry: {item_id}")
+        logger.debug("Deleted target list entry: %s", item_id)
         
         return JSONResponse(
             status_code=200, 
@@ -882,17 +407,18 @@ def delete_target_list_entry(item_id: int):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error deleting target list entry: {e}")
+        logger.exception("Error deleting target list entry %s", item_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @target_list_router.get('/{hcp_code}/by-code')
-def get_target_list_by_hcp_code(hcp_code: str):
+async def get_target_list_by_hcp_code(hcp_code: str):
     """Get target list entry by HCP code (unique field)"""
-    sb = _get_supabase()
     try:
-        resp = sb.table('target_list').select('*').eq('hcp_code', hcp_code).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
+        data = await _pg_fetch('SELECT * FROM target_list WHERE hcp_code = $1', hcp_code)
+        if data is None:
+            sb = await _get_supabase()
+            data = (await sb.table('target_list').select('*').eq('hcp_code', hcp_code).execute()).data
         
         if not data or len(data) == 0:
             raise HTTPException(status_code=404, detail=f'No entry found for HCP code: {hcp_code}')
@@ -904,13 +430,64 @@ def get_target_list_by_hcp_code(hcp_code: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Name search tries full-text search first so Postgres can answer it from a
+# GIN index instead of a sequential ILIKE '%name%' scan:
+#   CREATE INDEX idx_tl_fullname_fts ON target_list
+#     USING gin (to_tsvector('simple', full_name));
+# Each word is matched as a prefix ("shar" finds "Sharma"). Mid-word lookups
+# ("arma") find nothing that way, so an empty FTS result falls back to the
+# ILIKE substring search; results are the same as before, only faster when
+# a word prefix matches. Queries with explicit wildcards (% _ *) go straight
+# to ILIKE.
+_NAME_WILDCARDS = re.compile(r'[%_*]')
+_NAME_WORD = re.compile(r'\w+')
+
+
+def _name_tsquery(name: str) -> str:
+    """'dr ram sh' -> 'dr:* & ram:* & sh:*' (words only, so the tsquery always parses)"""
+    return ' & '.join(f'{word}:*' for word in _NAME_WORD.findall(name))
+
+
+def _name_pattern(name: str) -> str:
+    """ILIKE pattern for a name search; * works as a wildcard like %"""
+    return f"%{name.replace('*', '%')}%"
+
+
+async def _search_names_fts(tsquery: str, limit: int) -> List[Dict[str, Any]]:
+    data = await _pg_fetch(
+        "SELECT * FROM target_list"
+        " WHERE to_tsvector('simple', full_name) @@ to_tsquery('simple', $1)"
+        " ORDER BY ts_rank_cd(to_tsvector('simple', full_name), to_tsquery('simple', $1)) DESC"
+        " LIMIT $2",
+        tsquery, limit
+    )
+    if data is None:
+        sb = await _get_supabase()
+        query = sb.table('target_list').select('*').text_search('full_name', tsquery, options={'config': 'simple'})
+        data = (await query.limit(limit).execute()).data
+    return data
+
+
+async def _search_names_ilike(pattern: str, limit: int) -> List[Dict[str, Any]]:
+    data = await _pg_fetch(
+        'SELECT * FROM target_list WHERE full_name ILIKE $1 LIMIT $2', pattern, limit
+    )
+    if data is None:
+        sb = await _get_supabase()
+        data = (await sb.table('target_list').select('*').ilike('full_name', pattern).limit(limit).execute()).data
+    return data
+
+
 @target_list_router.get('/search/by-name')
-def search_target_list_by_name(name: str, limit: int = 20):
-    """Search target list entries by full name (case-insensitive)"""
-    sb = _get_supabase()
+async def search_target_list_by_name(name: str, limit: int = Query(20, ge=1, le=MAX_LIST_LIMIT)):
+    """Search target list entries by full name (case-insensitive substring match)"""
     try:
-        resp = sb.table('target_list').select('*').ilike('full_name', f'%{name}%').limit(limit).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
+        data = None
+        tsquery = _name_tsquery(name)
+        if tsquery and not _NAME_WILDCARDS.search(name):
+            data = await _search_names_fts(tsquery, limit)
+        if not data:
+            data = await _search_names_ilike(_name_pattern(name), limit)
         
         if not data:
             return []
@@ -921,12 +498,13 @@ def search_target_list_by_name(name: str, limit: int = 20):
 
 
 @target_list_router.get('/filter/by-specialty')
-def filter_target_list_by_specialty(specialty: str, limit: int = 100):
+async def filter_target_list_by_specialty(specialty: str, limit: int = Query(100, ge=1, le=MAX_LIST_LIMIT)):
     """Filter target list entries by specialty"""
-    sb = _get_supabase()
     try:
-        resp = sb.table('target_list').select('*').eq('specialty', specialty).limit(limit).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
+        data = await _pg_fetch('SELECT * FROM target_list WHERE specialty = $1 LIMIT $2', specialty, limit)
+        if data is None:
+            sb = await _get_supabase()
+            data = (await sb.table('target_list').select('*').eq('specialty', specialty).limit(limit).execute()).data
         
         return data if data else []
     except Exception as e:
@@ -934,12 +512,13 @@ def filter_target_list_by_specialty(specialty: str, limit: int = 100):
 
 
 @target_list_router.get('/filter/by-priority')
-def filter_target_list_by_priority(priority: bool = True, limit: int = 100):
+async def filter_target_list_by_priority(priority: bool = True, limit: int = Query(100, ge=1, le=MAX_LIST_LIMIT)):
     """Filter target list entries by priority status"""
-    sb = _get_supabase()
     try:
-        resp = sb.table('target_list').select('*').eq('priority', priority).limit(limit).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
+        data = await _pg_fetch('SELECT * FROM target_list WHERE priority = $1 LIMIT $2', priority, limit)
+        if data is None:
+            sb = await _get_supabase()
+            data = (await sb.table('target_list').select('*').eq('priority', priority).limit(limit).execute()).data
         
         return data if data else []
     except Exception as e:
@@ -947,12 +526,13 @@ def filter_target_list_by_priority(priority: bool = True, limit: int = 100):
 
 
 @target_list_router.get('/filter/by-category')
-def filter_target_list_by_category(category: str, limit: int = 100):
+async def filter_target_list_by_category(category: str, limit: int = Query(100, ge=1, le=MAX_LIST_LIMIT)):
     """Filter target list entries by category"""
-    sb = _get_supabase()
     try:
-        resp = sb.table('target_list').select('*').eq('category', category).limit(limit).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
+        data = await _pg_fetch('SELECT * FROM target_list WHERE category = $1 LIMIT $2', category, limit)
+        if data is None:
+            sb = await _get_supabase()
+            data = (await sb.table('target_list').select('*').eq('category', category).limit(limit).execute()).data
         
         return data if data else []
     except Exception as e:
@@ -960,9 +540,9 @@ def filter_target_list_by_category(category: str, limit: int = 100):
 
 
 @target_list_router.post('/bulk-create')
-def bulk_create_target_list_entries(items: List[Dict[str, Any]]):
+async def bulk_create_target_list_entries(items: List[Dict[str, Any]]):
     """Bulk create multiple target list entries"""
-    sb = _get_supabase()
+    sb = await _get_supabase()
     try:
         if not items or len(items) == 0:
             raise HTTPException(status_code=400, detail='No items provided')
@@ -978,7 +558,7 @@ def bulk_create_target_list_entries(items: List[Dict[str, Any]]):
         cleaned_items = []
         for item in items:
             if 'full_name' not in item or not item['full_name']:
-                print(f"⚠️ Skipping item without full_name: {item}")
+                logger.warning("Skipping item without full_name: %s", item)
                 continue
             
             cleaned_item = {k: v for k, v in item.items() if k in valid_columns}
@@ -987,11 +567,12 @@ def bulk_create_target_list_entries(items: List[Dict[str, Any]]):
         if not cleaned_items:
             raise HTTPException(status_code=400, detail='No valid items to create')
         
-        resp = sb.table('target_list').insert(cleaned_items).execute()
+        resp = await sb.table('target_list').insert(cleaned_items).execute()
+        response_cache.invalidate()
         
         inserted_count = len(resp.data) if resp.data else 0
         
-        print(f"✅ Bulk created {inserted_count} target list entries")
+        logger.debug("Bulk created %s target list entries", inserted_count)
         
         return {
             'success': True,
@@ -1004,14 +585,14 @@ def bulk_create_target_list_entries(items: List[Dict[str, Any]]):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error bulk creating target list entries: {e}")
+        logger.exception("Error bulk creating target list entries")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @target_list_router.post('/bulk-update')
-def bulk_update_target_list_entries(updates: List[Dict[str, Any]]):
+async def bulk_update_target_list_entries(updates: List[Dict[str, Any]]):
     """Bulk update multiple target list entries"""
-    sb = _get_supabase()
+    sb = await _get_supabase()
     try:
         if not updates or len(updates) == 0:
             raise HTTPException(status_code=400, detail='No updates provided')
@@ -1040,7 +621,7 @@ def bulk_update_target_list_entries(updates: List[Dict[str, Any]]):
                     errors.append(f'No valid fields to update for id {item_id}')
                     continue
                 
-                resp = sb.table('target_list').update(update_data).eq('id', item_id).execute()
+                resp = await sb.table('target_list').update(update_data).eq('id', item_id).execute()
                 
                 if resp.data:
                     updated_count += 1
@@ -1049,6 +630,9 @@ def bulk_update_target_list_entries(updates: List[Dict[str, Any]]):
             except Exception as e:
                 errors.append(f'Error updating id {update.get("id")}: {str(e)}')
         
+        if updated_count:
+            response_cache.invalidate()
+        
         return {
             'success': True,
             'items_updated': updated_count,
@@ -1060,114 +644,11 @@ def bulk_update_target_list_entries(updates: List[Dict[str, Any]]):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error bulk updating target list entries: {e}")
+        logger.exception("Error bulk updating target list entries")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 routers.append(target_list_router)
 
-work_logs_router = APIRouter(prefix='/work_logs', tags=['work_logs'])
-@work_logs_router.get('/', response_model=List[Dict[str, Any]])
-def list_work_logs(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('work_logs').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@work_logs_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_work_logs(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('work_logs').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@work_logs_router.get('/{item_id}')
-def get_work_logs(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('work_logs').select('*').eq('log_id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@work_logs_router.put('/{item_id}')
-def update_work_logs(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('work_logs').update(item).eq('log_id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@work_logs_router.delete('/{item_id}')
-def delete_work_logs(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('work_logs').delete().eq('log_id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(work_logs_router)
-
-v_current_lists_router = APIRouter(prefix='/v_current_lists', tags=['v_current_lists'])
-@v_current_lists_router.get('/', response_model=List[Dict[str, Any]])
-def list_v_current_lists(limit: int = 100):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('v_current_lists').select('*').limit(limit).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@v_current_lists_router.post('/', status_code=status.HTTP_201_CREATED)
-def create_v_current_lists(item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('v_current_lists').insert(item).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@v_current_lists_router.get('/{item_id}')
-def get_v_current_lists(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('v_current_lists').select('*').eq('id', item_id).execute()
-        data = resp.data if hasattr(resp, 'data') else resp
-        if not data:
-            raise HTTPException(status_code=404, detail='Not found')
-        return data[0]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@v_current_lists_router.put('/{item_id}')
-def update_v_current_lists(item_id: int, item: Dict[str, Any]):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('v_current_lists').update(item).eq('id', item_id).execute()
-        return resp.data if hasattr(resp, 'data') else resp
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@v_current_lists_router.delete('/{item_id}')
-def delete_v_current_lists(item_id: int):
-    sb = _get_supabase()
-    try:
-        resp = sb.table('v_current_lists').delete().eq('id', item_id).execute()
-        return JSONResponse(status_code=200, content={'deleted': True})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-routers.append(v_current_lists_router)
\ No newline at end of file
+routers.append(make_crud_router('work_logs', 'log_id'))
+routers.append(make_crud_router('v_current_lists', 'id'))
\ No newline at end of file
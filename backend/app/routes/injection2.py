@@ -5,11 +5,12 @@ Processes documents to automatically update target_list with full history tracki
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from app.core.database import get_supabase_client
-from app.core.pinecone_client import pc
+from app.core.pinecone_client import get_pinecone_index
+from app.chatbot.query_cache import response_cache, search_cache
+from app.chatbot.embeddings import get_embedding_model
 import tempfile
 import docx2txt
 import fitz  # PyMuPDF for PDF reading
-from sentence_transformers import SentenceTransformer
 import google.generativeai as genai
 import hashlib
 import os
@@ -29,11 +30,6 @@ router = APIRouter(prefix="/injection", tags=["Injection"])
 # Initialize services
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 llm = genai.GenerativeModel("gemini-2.0-flash")
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-
-# Get Pinecone index
-index_name = os.getenv("PINECONE_INDEX_NAME", "document-store")
-index = pc.Index(index_name)
 
 # Database connection
 SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
@@ -376,6 +372,7 @@ async def inject_data(
         tmp.write(content)
         tmp_path = tmp.name
 
+    index_changed = False
     try:
         print(f"\n{'='*70}")
         print(f"🚀 SMART DOCUMENT INJECTION STARTED")
@@ -415,7 +412,7 @@ async def inject_data(
         # Step 6: Split text into chunks
         print(f"6️⃣  Preparing document chunks...")
         text_chunks = chunk_text(extracted_text)
-        chunk_embeddings = embedding_model.encode(text_chunks).tolist()
+        chunk_embeddings = get_embedding_model().encode(text_chunks).tolist()
         print(f"   ✅ Created {len(text_chunks)} chunks")
         
         # Step 7: Store in Pinecone with metadata
@@ -448,7 +445,8 @@ async def inject_data(
             
             vectors_to_upsert.append((chunk_id, embedding, metadata))
         
-        index.upsert(vectors=vectors_to_upsert)
+        index_changed = True
+        get_pinecone_index().upsert(vectors=vectors_to_upsert)
         print(f"   ✅ Stored {len(vectors_to_upsert)} chunks in Pinecone")
         
         # Step 8: Find and UPDATE the trigger-created history entry (don't create new one!)
@@ -537,6 +535,11 @@ async def inject_data(
         )
     
     finally:
+        # Even a failed or partial upsert may have changed the index, and the
+        # history entry is updated after it; clear cached answers last
+        if index_changed:
+            search_cache.invalidate()
+            response_cache.invalidate()
         # Clean up temporary file
         if os.path.exists(tmp_path):
             os.remove(tmp_path)
@@ -557,13 +560,13 @@ async def search_documents(query: str, top_k: int = 5, table_name: str = None):
     """
     try:
         # Generate embedding for search query
-        query_embedding = embedding_model.encode([query]).tolist()[0]
+        query_embedding = get_embedding_model().encode(query).tolist()
         
         # Prepare filter if table_name is provided
         filter_dict = {"table_name": {"$eq": table_name}} if table_name else None
         
         # Search in Pinecone
-        results = index.query(
+        results = get_pinecone_index().query(
             vector=query_embedding,
             top_k=top_k,
             include_metadata=True,
@@ -651,7 +654,7 @@ async def get_document_details(doc_id: str):
         
         # Get chunks from Pinecone
         try:
-            pinecone_results = index.query(
+            pinecone_results = get_pinecone_index().query(
                 vector=[0.0] * 384,  # Dummy vector for metadata retrieval
                 top_k=100,
                 filter={"doc_id": {"$eq": doc_id}},
@@ -761,11 +764,12 @@ async def delete_document(doc_id: str):
     Returns:
         Success message with deletion details
     """
+    index_changed = False
     try:
         supabase = get_supabase_client()
         
         # Find all chunks in Pinecone for this document
-        results = index.query(
+        results = get_pinecone_index().query(
             vector=[0] * 384,  # Dummy vector
             top_k=10000,
             include_metadata=True,
@@ -775,7 +779,8 @@ async def delete_document(doc_id: str):
         # Delete chunks from Pinecone
         chunk_ids_to_delete = [match["id"] for match in results.get("matches", [])]
         if chunk_ids_to_delete:
-            index.delete(ids=chunk_ids_to_delete)
+            index_changed = True
+            get_pinecone_index().delete(ids=chunk_ids_to_delete)
             print(f"✅ Deleted {len(chunk_ids_to_delete)} chunks from Pinecone")
         
         # Get next version number from sequence
@@ -813,4 +818,10 @@ async def delete_document(doc_id: str):
         raise HTTPException(
             status_code=500,
             detail=f"Error deleting document: {str(e)}"
-        )
\ No newline at end of file
+        )
+    
+    finally:
+        # Clear cached searches/answers after the index and history both changed
+        if index_changed:
+            search_cache.invalidate()
+            response_cache.invalidate()
\ No newline at end of file
@@ -6,6 +6,7 @@ Version control for target_list is handled via database triggers
 from fastapi import APIRouter, HTTPException, status
 from fastapi.responses import JSONResponse
 from app.core.database import get_supabase_client
+from app.chatbot.query_cache import response_cache
 from typing import List, Dict, Any, Optional
 from fastapi import UploadFile, File
 import csv
@@ -188,6 +189,7 @@ def create_list(payload: Dict[str, Any]):
             payload['status'] = 'In Progress'
         
         resp = sb.table('list_requests').insert(payload).execute()
+        response_cache.invalidate()
         data = resp.data if hasattr(resp, 'data') else resp
         
         if data and len(data) > 0:
@@ -210,6 +212,7 @@ def update_list(list_id: int, payload: Dict[str, Any]):
         payload.pop('created_at', None)
         
         resp = sb.table('list_requests').update(payload).eq('request_id', list_id).execute()
+        response_cache.invalidate()
         data = resp.data if hasattr(resp, 'data') else resp
         
         if not data or len(data) == 0:
@@ -229,6 +232,7 @@ def delete_list(list_id: int):
     sb = _get_supabase()
     try:
         resp = sb.table('list_requests').delete().eq('request_id', list_id).execute()
+        response_cache.invalidate()
         return JSONResponse(status_code=200, content={'deleted': True, 'list_id': list_id})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
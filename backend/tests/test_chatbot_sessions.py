@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from app.chatbot import nodes
+from app.chatbot.query_cache import response_cache
+from app.routes import chatbot
+
+
+class SummarizerOnlyGraph:
+    """Stands in for the agent graph: runs summarizer_node on an empty result"""
+
+    def __init__(self):
+        self.calls = 0
+        self.inputs = []
+
+    async def ainvoke(self, state):
+        self.calls += 1
+        self.inputs.append(state)
+        state = {**state, "route": "database_only", "results": [], "results_count": 0}
+        updates = nodes.summarizer_node(state)
+        history = state["conversation_history"] + updates.pop("conversation_history")
+        return {**state, **updates, "conversation_history": history}
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    fake = SummarizerOnlyGraph()
+    monkeypatch.setattr(chatbot, "get_agent_graph", lambda: fake)
+    response_cache.invalidate()
+    for store in (chatbot.conversation_sessions, chatbot.session_context_lines, chatbot.session_last_versions):
+        store.clear()
+    return fake
+
+
+def ask(question, session_id="s1"):
+    return asyncio.run(chatbot.chat_query(chatbot.ChatbotRequest(question=question, session_id=session_id)))
+
+
+def test_summarizer_records_the_turn():
+    updates = nodes.summarizer_node({"user_query": "list HCPs", "route": "database_only", "results": []})
+    [turn] = updates["conversation_history"]
+    assert turn["query"] == "list HCPs"
+    assert turn["response"] == updates["response"]
+
+
+def test_answered_turn_is_stored_in_the_session(graph):
+    ask("list HCPs in target list 3")
+    history = chatbot.conversation_sessions["s1"]
+    assert [turn["query"] for turn in history] == ["list HCPs in target list 3"]
+    assert len(chatbot.session_context_lines["s1"]) == 1
+
+
+def test_repeated_question_is_answered_from_cache(graph):
+    first = ask("list HCPs in target list 3")
+    second = ask("list HCPs in target list 3")
+    assert graph.calls == 1
+    assert second.answer == first.answer
+    assert len(chatbot.conversation_sessions["s1"]) == 2
+    assert len(chatbot.session_context_lines["s1"]) == 2
+
+
+@pytest.mark.parametrize("question", ["show their emails", "what about the previous one?"])
+def test_context_dependent_question_is_not_cached(graph, question):
+    assert chatbot.response_cache_key(chatbot.ChatbotRequest(question=question), "s1") is None
+    ask(question)
+    ask(question)
+    assert graph.calls == 2
+
+
+def test_answered_turn_feeds_the_next_context_summary(graph):
+    ask("list HCPs in target list 3")
+    ask("show their emails")
+    context = graph.inputs[-1]["context_summary"]
+    assert context.startswith("Recent conversation:")
+    assert "list HCPs in target list 3" in context
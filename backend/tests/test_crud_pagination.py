@@ -0,0 +1,67 @@
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.routes import crud
+
+
+class RecordingQuery:
+    """Records the PostgREST builder calls _page makes"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+        return call
+
+
+def test_page_without_cursor_orders_and_limits():
+    query = crud._page(RecordingQuery(), "id", 50)
+    assert query.calls == [("order", ("id",)), ("limit", (50,))]
+
+
+def test_page_with_cursor_reads_after_it():
+    query = crud._page(RecordingQuery(), "id", 50, cursor=120)
+    assert query.calls == [("gt", ("id", 120)), ("order", ("id",)), ("limit", (50,))]
+
+
+def test_next_cursor_only_on_full_pages():
+    rows = [{"id": 1}, {"id": 2}]
+
+    full = Response()
+    crud._set_next_cursor(full, rows, "id", limit=2)
+    assert full.headers["X-Next-Cursor"] == "2"
+
+    partial = Response()
+    crud._set_next_cursor(partial, rows, "id", limit=3)
+    assert "X-Next-Cursor" not in partial.headers
+
+
+def client_with_rows(monkeypatch, rows):
+    calls = []
+
+    async def fake_pg_fetch(sql, *args):
+        calls.append(args)
+        return rows
+
+    monkeypatch.setattr(crud, "_pg_fetch", fake_pg_fetch)
+    app = FastAPI()
+    app.include_router(crud.target_list_router, prefix="/api")
+    return TestClient(app), calls
+
+
+def test_list_endpoint_pages_by_cursor(monkeypatch):
+    client, calls = client_with_rows(monkeypatch, [{"id": 11}, {"id": 12}])
+    resp = client.get("/api/target_list/", params={"limit": 2, "cursor": 10})
+    assert resp.status_code == 200
+    assert resp.json() == [{"id": 11}, {"id": 12}]
+    assert resp.headers["X-Next-Cursor"] == "12"
+    assert calls == [(10, 2)]
+
+
+def test_list_limit_is_capped(monkeypatch):
+    client, _ = client_with_rows(monkeypatch, [])
+    assert client.get("/api/target_list/", params={"limit": crud.MAX_LIST_LIMIT + 1}).status_code == 422
+    assert client.get("/api/target_list/", params={"limit": 0}).status_code == 422
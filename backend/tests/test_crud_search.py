@@ -0,0 +1,41 @@
+import asyncio
+
+from app.routes import crud
+
+
+def test_name_tsquery_prefixes_each_word():
+    assert crud._name_tsquery("Dr. Ram Sh") == "Dr:* & Ram:* & Sh:*"
+    assert crud._name_tsquery("o'brien & co") == "o:* & brien:* & co:*"
+    assert crud._name_tsquery(" - ") == ""
+
+
+def run_search(monkeypatch, name, results):
+    """Run the search against a fake pool; results maps 'fts'/'ilike' to rows"""
+    calls = []
+
+    async def fake_pg_fetch(sql, *args):
+        kind = "fts" if "to_tsquery" in sql else "ilike"
+        calls.append((kind, args[0]))
+        return results.get(kind, [])
+
+    monkeypatch.setattr(crud, "_pg_fetch", fake_pg_fetch)
+    rows = asyncio.run(crud.search_target_list_by_name(name, limit=20))
+    return rows, calls
+
+
+def test_word_prefix_uses_fts_only(monkeypatch):
+    rows, calls = run_search(monkeypatch, "shar", {"fts": [{"full_name": "Ravi Sharma"}]})
+    assert rows == [{"full_name": "Ravi Sharma"}]
+    assert calls == [("fts", "shar:*")]
+
+
+def test_mid_word_falls_back_to_ilike(monkeypatch):
+    rows, calls = run_search(monkeypatch, "arma", {"ilike": [{"full_name": "Ravi Sharma"}]})
+    assert rows == [{"full_name": "Ravi Sharma"}]
+    assert calls == [("fts", "arma:*"), ("ilike", "%arma%")]
+
+
+def test_wildcards_skip_fts(monkeypatch):
+    rows, calls = run_search(monkeypatch, "r*sharma", {"ilike": []})
+    assert rows == []
+    assert calls == [("ilike", "%r%sharma%")]
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app.chatbot import nodes
+from app.chatbot.state_machine import build_agent_graph
+
+
+@pytest.fixture
+def no_classifier_llm(monkeypatch):
+    async def fail(*args, **kwargs):
+        raise AssertionError("small talk must not reach the LLM classifier")
+    monkeypatch.setattr(nodes, "llm_classify_query", fail)
+
+
+@pytest.mark.parametrize("query, pattern", [
+    ("hello", "hello"),
+    ("Hello!", "hello"),
+    ("What can you do?", "what can you do"),
+])
+def test_small_talk_gets_canned_reply(no_classifier_llm, query, pattern):
+    state = asyncio.run(build_agent_graph().ainvoke({"user_query": query, "conversation_history": []}))
+    assert state["route"] == "invalid"
+    assert state["response"] == nodes.CANNED_INVALID_REPLIES[pattern]
+    assert state["conversation_history"][-1]["response"] == state["response"]
+
+
+def test_summarizer_keeps_invalid_handler_reply():
+    assert nodes.summarizer_node({"route": "invalid", "response": "Hi!"}) == {}
+
+
+def test_router_keeps_invalid_classification(monkeypatch):
+    async def classify(*args, **kwargs):
+        return {"route": "invalid", "reasoning": "off topic", "confidence": 0.9}
+    monkeypatch.setattr(nodes, "llm_classify_query", classify)
+    updates = asyncio.run(nodes.router_node({"user_query": "recommend a holiday destination"}))
+    assert updates["route"] == "invalid"
+
+
+def test_off_topic_gets_memoized_suggestion(monkeypatch):
+    prompts = []
+
+    def fake_generate(prompt):
+        prompts.append(prompt)
+        return "**Try** asking about the target list."
+
+    async def classify(*args, **kwargs):
+        return {"route": "invalid", "reasoning": "off topic", "confidence": 0.9}
+
+    monkeypatch.setattr(nodes, "generate_streamed", fake_generate)
+    monkeypatch.setattr(nodes, "llm_classify_query", classify)
+    nodes.suggestion_cache.invalidate()
+
+    graph = build_agent_graph()
+    for _ in range(2):
+        state = asyncio.run(graph.ainvoke({"user_query": "book me a flight", "conversation_history": []}))
+        assert state["route"] == "invalid"
+        assert state["response"] == "Try asking about the target list."
+    assert len(prompts) == 1
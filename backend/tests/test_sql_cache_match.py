@@ -0,0 +1,25 @@
+from app.chatbot.nodes import sql_literals_match
+
+
+def test_literal_must_match_whole_words():
+    sql = "SELECT * FROM target_list WHERE gender = 'Male'"
+    assert sql_literals_match(sql, "list male doctors")
+    assert not sql_literals_match(sql, "list female doctors")
+
+
+def test_multi_word_and_ilike_literals():
+    sql = "SELECT * FROM target_list WHERE city ILIKE '%new delhi%'"
+    assert sql_literals_match(sql, "HCPs in New Delhi")
+    assert not sql_literals_match(sql, "HCPs in Delhi")
+
+
+def test_literal_with_regex_characters():
+    sql = "SELECT * FROM target_list WHERE qualification = 'M.D.'"
+    assert sql_literals_match(sql, "doctors with an m.d. degree")
+    assert not sql_literals_match(sql, "doctors with an mxdx degree")
+
+
+def test_numbers_must_agree():
+    sql = "SELECT * FROM target_list WHERE experience_years > 10 LIMIT 50"
+    assert sql_literals_match(sql, "doctors with more than 10 years")
+    assert not sql_literals_match(sql, "doctors with more than 15 years")
@@ -0,0 +1,32 @@
+import pytest
+
+from app.chatbot.nodes import validate_sql
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT full_name, city FROM target_list WHERE gender = 'Female'",
+    "SELECT t.* FROM target_list t",
+    "SELECT x.* FROM (SELECT id, full_name FROM target_list) x",
+    "SELECT specialty, COUNT(*) AS n FROM target_list GROUP BY specialty ORDER BY n DESC",
+    "WITH recent AS (SELECT version_number FROM history_table) SELECT * FROM recent",
+    "SELECT LOWER(full_name) FROM target_list",
+])
+def test_accepts_read_only_queries(sql):
+    assert validate_sql(sql) == (True, "")
+
+
+@pytest.mark.parametrize("sql, reason", [
+    ("DELETE FROM target_list", "only SELECT"),
+    ("SELECT 1; SELECT 2", "exactly one"),
+    ("SELECT * FROM users", "unknown table"),
+    ("SELECT salary FROM target_list", "unknown column"),
+    ("SELECT * FROM target_list FOR UPDATE", "locking"),
+    ("SELECT * FROM target_list FOR SHARE SKIP LOCKED", "locking"),
+    ("SELECT pg_sleep(10)", "pg_sleep"),
+    ("SELECT pg_read_file('/etc/passwd') FROM target_list", "pg_read_file"),
+    ("SELECT set_config('role', 'postgres', false)", "set_config"),
+])
+def test_rejects_unsafe_or_unknown_sql(sql, reason):
+    ok, message = validate_sql(sql)
+    assert not ok
+    assert reason in message